@@ -36,9 +36,8 @@ from core.web_socket_core import (
     WebSocketMessage,
     MessageType,
     UserInfo,
-    parse_websocket_message,
-    validate_message,
-    create_error_message,
+    parse_websocket_frame,
+    create_error_bytes,
     generate_connection_id
 )
 
@@ -1251,36 +1250,23 @@ async def websocket_endpoint(
                 data = await websocket.receive_text()
                 logger.debug(f"收到消息 from {connection_id}: {data}")
                 
-                # 解析消息
+                # 解析消息（JSON 只解析一次）
                 try:
-                    message_data = json.loads(data)
-                    
-                    # 验证消息格式
-                    is_valid, error_msg = validate_message(message_data)
-                    if not is_valid:
-                        error_response = create_error_message(
-                            "INVALID_MESSAGE", 
-                            error_msg or "消息格式无效",
-                            connection_id
-                        )
-                        await connection_manager.send_to_connection(
-                            connection_id, 
-                            error_response
-                        )
-                        continue
-                    
-                    # 解析消息
-                    message, parse_error = parse_websocket_message(data)
+                    message, error_code, error_msg = parse_websocket_frame(data)
                     if message is None:
-                        error_response = create_error_message(
-                            "PARSE_ERROR",
-                            parse_error or "消息解析失败",
-                            connection_id
-                        )
-                        await connection_manager.send_to_connection(
-                            connection_id,
-                            error_response
-                        )
+                        if error_code == "MESSAGE_TOO_LARGE":
+                            error_msg = "消息过大"
+                        elif error_code == "INVALID_JSON":
+                            logger.error(f"无效的 JSON 消息: {data}")
+                            error_msg = "无效的 JSON 格式"
+                        elif error_code == "COMMAND_TOO_LARGE":
+                            error_msg = "命令消息过大"
+                        elif error_code == "INVALID_MESSAGE":
+                            error_msg = error_msg or "消息格式无效"
+                        else:
+                            error_msg = error_msg or "消息解析失败"
+                        error_frame = create_error_bytes(error_code, error_msg, connection_id).decode()
+                        await connection_manager.send_raw_to_connection(connection_id, error_frame)
                         continue
                     
                     # 设置发送者信息和房间ID
@@ -1296,28 +1282,14 @@ async def websocket_endpoint(
                         # 其他消息类型使用默认处理器
                         await connection_manager.handle_message(connection_id, message)
                     
-                except json.JSONDecodeError:
-                    logger.error(f"无效的 JSON 消息: {data}")
-                    error_response = create_error_message(
-                        "INVALID_JSON",
-                        "无效的 JSON 格式",
-                        connection_id
-                    )
-                    await connection_manager.send_to_connection(
-                        connection_id,
-                        error_response
-                    )
                 except Exception as e:
                     logger.error(f"处理消息时发生错误: {str(e)}")
-                    error_response = create_error_message(
+                    error_frame = create_error_bytes(
                         "MESSAGE_PROCESSING_ERROR",
                         f"消息处理错误: {str(e)}",
                         connection_id
-                    )
-                    await connection_manager.send_to_connection(
-                        connection_id,
-                        error_response
-                    )
+                    ).decode()
+                    await connection_manager.send_raw_to_connection(connection_id, error_frame)
                     
             except WebSocketDisconnect:
                 logger.info(f"WebSocket 连接断开: {connection_id}")
@@ -1363,23 +1335,24 @@ async def broadcast_message(
             room_id=None
         )
         
-        sent_count = 0
+        queued_count = 0
         
         # 根据目标发送消息
         if room_id:
             # 发送到指定房间
-            sent_count = await connection_manager.broadcast_to_room(room_id, message)
+            queued_count = await connection_manager.broadcast_to_room(room_id, message)
         elif user_id:
             # 发送到指定用户
-            sent_count = await connection_manager.send_to_user(user_id, message)
+            queued_count = await connection_manager.send_to_user(user_id, message)
         else:
             # 广播到所有连接
-            sent_count = await connection_manager.broadcast_to_all(message)
+            queued_count = await connection_manager.broadcast_to_all(message)
         
         return {
             "status": "success",
             "message": "消息发送成功",
-            "sent_count": sent_count,
+            # 为兼容保留字段名；数值是已放入写队列的连接数，不代表已送达
+            "sent_count": queued_count,
             "message_id": message.id
         }
         
@@ -5,17 +5,40 @@
 """
 
 import asyncio
+import heapq
 import logging
+import random
 import time
-from typing import Dict, Optional, Any, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Any, List, Set, Callable, Tuple
 from threading import RLock
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from cachetools import LRUCache
 
 from agent.personal_assistant_manager import PersonalAssistantManager, PersonalAssistantContext
 from agent.agent_session import AgentSessionManager
 from service.service_manager import service_manager
 
 
+class _EvictingLRUCache(LRUCache):
+    """LRU缓存，淘汰条目时回调 on_evict(key, value) 以释放关联资源"""
+    
+    def __init__(self, maxsize: int, on_evict: Callable[[Any, Any], None]):
+        super().__init__(maxsize)
+        self._on_evict = on_evict
+    
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+    
+    def clear(self):
+        """清空缓存（不触发淘汰回调，资源由调用方负责释放）"""
+        while self:
+            super().popitem()
+
+
 class PerformanceManager:
     """
     全局性能管理器
@@ -24,6 +47,27 @@ class PerformanceManager:
     提高多用户并发场景下的性能
     """
     
+    __slots__ = (
+        "_lock",
+        "_logger",
+        "_assistant_manager",
+        "_assistant_manager_initialized",
+        "_agent_mapping",
+        "_session_managers",
+        "_user_contexts",
+        "_context_cache_expiry",
+        "_expiry_heap",
+        "_in_flight_contexts",
+        "_context_generations",
+        "_context_cache_ttl_range",
+        "_ttl_random",
+        "_context_dependency_tags",
+        "_tag_index",
+        "_stats",
+        "_start_time",
+        "_initialized",
+    )
+    
     def __init__(self):
         self._lock = RLock()
         self._logger = logging.getLogger(__name__)
@@ -32,24 +76,48 @@ class PerformanceManager:
         self._assistant_manager: Optional[PersonalAssistantManager] = None
         self._assistant_manager_initialized = False
         
-        # 会话管理器缓存 - 按用户ID缓存
-        self._session_managers: Dict[int, AgentSessionManager] = {}
+        # agent名称到管理器方法的映射，assistant manager初始化后构建一次
+        self._agent_mapping: Dict[str, Callable[[], Any]] = {}
+        
+        # 会话管理器缓存 - 按用户ID缓存，LRU淘汰
+        self._session_managers: Dict[int, AgentSessionManager] = _EvictingLRUCache(
+            maxsize=1024, on_evict=self._on_session_manager_evicted
+        )
         
-        # 用户上下文缓存
-        self._user_contexts: Dict[int, PersonalAssistantContext] = {}
-        self._context_cache_expiry: Dict[int, datetime] = {}
-        self._context_cache_duration = timedelta(minutes=10)  # 10分钟缓存
+        # 用户上下文缓存 - LRU淘汰时同步清理过期时间与依赖标签
+        self._user_contexts: Dict[int, PersonalAssistantContext] = _EvictingLRUCache(
+            maxsize=4096, on_evict=self._on_user_context_evicted
+        )
+        # 过期时间使用 time.monotonic() 秒数，比较开销低且不受系统时钟调整影响
+        self._context_cache_expiry: Dict[int, float] = {}
+        # 过期时间最小堆 (expiry, user_id)，清理时只需弹出已过期的条目；
+        # 条目刷新或失效后堆中残留的旧记录在弹出时与字典比对后忽略
+        self._expiry_heap: List[Tuple[float, int]] = []
+        # 正在创建中的用户上下文: user_id -> Future
+        self._in_flight_contexts: Dict[int, Future] = {}
+        # 正在创建中的上下文的失效代数: user_id -> 代数；创建期间收到失效通知时递增，
+        # 创建结束时若代数变化则不缓存（上下文可能读到了写入前的数据）。只记录创建中的用户
+        self._context_generations: Dict[int, int] = {}
+        # 上下文由写入时的失效通知保持新鲜，TTL 仅作兜底；
+        # 有效期在 55~65 分钟之间随机抖动，避免同一时间写入的缓存集中过期
+        self._context_cache_ttl_range = (timedelta(minutes=55), timedelta(minutes=65))
+        self._ttl_random = random.Random()
         
-        # 性能统计
-        self._stats = {
+        # 依赖标签索引: 缓存条目 -> 依赖标签，依赖标签 -> 缓存条目
+        self._context_dependency_tags: Dict[int, Set[str]] = {}
+        self._tag_index: Dict[str, Set[int]] = {}
+        service_manager.subscribe_invalidation(self.invalidate_by_tag)
+        
+        # 性能统计（计数器在 self._lock 内更新和读取）
+        self._stats: Dict[str, int] = {
             "agent_manager_hits": 0,
             "session_manager_hits": 0,
             "session_manager_creates": 0,
             "context_cache_hits": 0,
             "context_cache_misses": 0,
             "total_requests": 0,
-            "start_time": time.time()
         }
+        self._start_time = time.time()
         
         # 初始化状态
         self._initialized = False
@@ -103,6 +171,16 @@ class PerformanceManager:
             if not success:
                 raise RuntimeError("Assistant manager初始化失败")
             
+            # 映射agent名称到管理器方法
+            self._agent_mapping = {
+                "Triage Agent": self._assistant_manager.get_triage_agent,
+                "Weather Agent": self._assistant_manager.get_weather_agent,
+                "News Agent": self._assistant_manager.get_news_agent,
+                "Recipe Agent": self._assistant_manager.get_recipe_agent,
+                "Personal Assistant Agent": self._assistant_manager.get_personal_agent,
+                "Conversation Title Agent": self._assistant_manager.get_conversation_title_agent,
+            }
+            
             self._assistant_manager_initialized = True
             self._logger.info("✅ 全局Assistant Manager初始化完成")
             
@@ -123,7 +201,8 @@ class PerformanceManager:
         if not self._initialized or not self._assistant_manager_initialized or self._assistant_manager is None:
             raise RuntimeError("性能管理器尚未初始化")
         
-        self._stats["agent_manager_hits"] += 1
+        with self._lock:
+            self._stats["agent_manager_hits"] += 1
         return self._assistant_manager
     
     def get_session_manager(self, user_id: int) -> AgentSessionManager:
@@ -139,17 +218,12 @@ class PerformanceManager:
         if not self._initialized:
             raise RuntimeError("性能管理器尚未初始化")
         
-        # 检查缓存
-        if user_id in self._session_managers:
-            self._stats["session_manager_hits"] += 1
-            return self._session_managers[user_id]
-        
-        # 创建新的会话管理器
         with self._lock:
-            # 双重检查锁定
-            if user_id in self._session_managers:
+            # LRU缓存的读取也会调整淘汰顺序，因此在锁内完成
+            session_manager = self._session_managers.get(user_id)
+            if session_manager is not None:
                 self._stats["session_manager_hits"] += 1
-                return self._session_managers[user_id]
+                return session_manager
             
             # 使用service_manager提供的共享数据库客户端
             db_client = service_manager.get_db_client()
@@ -161,9 +235,9 @@ class PerformanceManager:
                 default_user_id=user_id,
                 max_messages=100
             )
+            self._stats["session_manager_creates"] += 1
             
             self._session_managers[user_id] = session_manager
-            self._stats["session_manager_creates"] += 1
             
             self._logger.info(f"✅ 为用户 {user_id} 创建新的会话管理器")
             return session_manager
@@ -182,42 +256,118 @@ class PerformanceManager:
         if not self._initialized:
             raise RuntimeError("性能管理器尚未初始化")
         
-        # 检查缓存
-        if not force_refresh and user_id in self._user_contexts:
-            if datetime.now() < self._context_cache_expiry.get(user_id, datetime.min):
-                self._stats["context_cache_hits"] += 1
-                self._logger.debug(f"🎯 用户 {user_id} 上下文缓存命中")
-                return self._user_contexts[user_id]
-        
-        # 缓存未命中或过期
-        self._stats["context_cache_misses"] += 1
-        
         with self._lock:
-            # 双重检查锁定
-            if not force_refresh and user_id in self._user_contexts:
-                if datetime.now() < self._context_cache_expiry.get(user_id, datetime.min):
+            # 检查缓存（LRU缓存的读取也会调整淘汰顺序，因此在锁内完成）
+            if not force_refresh:
+                context = self._user_contexts.get(user_id)
+                if context is not None and time.monotonic() < self._context_cache_expiry.get(user_id, 0.0):
                     self._stats["context_cache_hits"] += 1
-                    return self._user_contexts[user_id]
+                    self._logger.debug(f"🎯 用户 {user_id} 上下文缓存命中")
+                    return context
             
-            # 创建新的用户上下文
-            try:
-                self._logger.info(f"🔄 刷新用户 {user_id} 的上下文缓存")
-                
-                if self._assistant_manager is None:
-                    raise RuntimeError("Assistant manager未初始化")
-                
-                context = self._assistant_manager.create_user_context(user_id)
-                
-                # 缓存上下文
-                self._user_contexts[user_id] = context
-                self._context_cache_expiry[user_id] = datetime.now() + self._context_cache_duration
-                
-                self._logger.debug(f"✅ 用户 {user_id} 上下文已缓存")
-                return context
-                
-            except Exception as e:
-                self._logger.error(f"❌ 创建用户 {user_id} 上下文失败: {e}")
-                raise
+            # 缓存未命中或过期
+            self._stats["context_cache_misses"] += 1
+            
+            if self._assistant_manager is None:
+                raise RuntimeError("Assistant manager未初始化")
+            
+            # 同一用户的并发未命中只创建一次上下文，其余调用等待同一个结果
+            future = self._in_flight_contexts.get(user_id)
+            is_builder = future is None
+            if is_builder:
+                future = Future()
+                self._in_flight_contexts[user_id] = future
+                self._context_generations[user_id] = 0
+        
+        if not is_builder:
+            self._logger.debug(f"⏳ 等待用户 {user_id} 正在创建的上下文")
+            return future.result()
+        
+        # 创建新的用户上下文（不持有全局锁，避免阻塞其他用户的请求）；
+        # 任何异常（包括 CancelledError/KeyboardInterrupt）都要在 finally 中移除并完成 Future，避免等待方永久阻塞
+        context: Optional[PersonalAssistantContext] = None
+        error: Optional[BaseException] = None
+        try:
+            self._logger.info(f"🔄 刷新用户 {user_id} 的上下文缓存")
+            context = self._assistant_manager.create_user_context(user_id)
+        except BaseException as e:
+            error = e
+            self._logger.error(f"❌ 创建用户 {user_id} 上下文失败: {e!r}")
+            raise
+        finally:
+            with self._lock:
+                self._in_flight_contexts.pop(user_id, None)
+                invalidated = self._context_generations.pop(user_id, 0) != 0
+                if error is None and not invalidated:
+                    # 缓存上下文
+                    self._user_contexts[user_id] = context
+                    expiry = time.monotonic() + self._next_context_ttl()
+                    self._context_cache_expiry[user_id] = expiry
+                    heapq.heappush(self._expiry_heap, (expiry, user_id))
+                    self._register_dependency_tags(user_id, self._context_dependencies(user_id))
+            
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(context)
+        
+        if invalidated:
+            self._logger.debug(f"⚠️ 用户 {user_id} 的数据在创建上下文期间已变更，本次结果不缓存")
+        else:
+            self._logger.debug(f"✅ 用户 {user_id} 上下文已缓存")
+        return context
+    
+    def _next_context_ttl(self) -> float:
+        """生成带随机抖动的上下文缓存有效期（秒）"""
+        ttl_min, ttl_max = self._context_cache_ttl_range
+        return self._ttl_random.uniform(ttl_min.total_seconds(), ttl_max.total_seconds())
+    
+    @staticmethod
+    def _context_dependencies(user_id: int) -> Set[str]:
+        """
+        用户上下文所依赖的数据标签（与 create_user_context 读取的本地数据对应）
+        
+        用户资料来自只读的 JSONPlaceholder API，本服务不会写入，因此没有对应标签，仅靠 TTL 刷新
+        """
+        return {f"preferences:{user_id}", f"todos:{user_id}"}
+    
+    def _register_dependency_tags(self, user_id: int, tags: Set[str]):
+        """登记缓存条目的依赖标签（需持有锁）"""
+        self._unregister_dependency_tags(user_id)
+        self._context_dependency_tags[user_id] = tags
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(user_id)
+    
+    def _unregister_dependency_tags(self, user_id: int):
+        """移除缓存条目的依赖标签（需持有锁）"""
+        for tag in self._context_dependency_tags.pop(user_id, ()):
+            user_ids = self._tag_index.get(tag)
+            if user_ids is not None:
+                user_ids.discard(user_id)
+                if not user_ids:
+                    del self._tag_index[tag]
+    
+    def _on_session_manager_evicted(self, user_id: int, session_manager: AgentSessionManager):
+        """
+        会话管理器被LRU淘汰时只移除缓存引用
+        
+        调用方可能仍在使用该实例处理请求，因此不在此处关闭；
+        最后一个引用释放后由 AgentSessionManager.__del__ 关闭其会话
+        """
+        self._logger.info(f"♻️ 用户 {user_id} 的会话管理器已被淘汰")
+    
+    def _on_user_context_evicted(self, user_id: int, context: PersonalAssistantContext):
+        """用户上下文被LRU淘汰时清理关联的过期时间与依赖标签"""
+        self._context_cache_expiry.pop(user_id, None)
+        self._unregister_dependency_tags(user_id)
+    
+    def _drop_user_context(self, user_id: int):
+        """删除指定用户的上下文缓存条目，并使正在创建的上下文不被缓存（需持有锁）"""
+        if user_id in self._context_generations:
+            self._context_generations[user_id] += 1
+        self._user_contexts.pop(user_id, None)
+        self._context_cache_expiry.pop(user_id, None)
+        self._unregister_dependency_tags(user_id)
     
     def invalidate_user_context(self, user_id: int):
         """
@@ -227,12 +377,31 @@ class PerformanceManager:
             user_id: 用户ID
         """
         with self._lock:
-            if user_id in self._user_contexts:
-                del self._user_contexts[user_id]
-            if user_id in self._context_cache_expiry:
-                del self._context_cache_expiry[user_id]
+            self._drop_user_context(user_id)
             self._logger.info(f"🗑️ 已清除用户 {user_id} 的上下文缓存")
     
+    def invalidate_by_tag(self, tag: str):
+        """
+        使依赖指定标签的所有上下文缓存失效
+        
+        由 service_manager 在数据写入提交后回调
+        
+        Args:
+            tag: 依赖标签，如 "todos:1"
+        """
+        with self._lock:
+            user_ids = list(self._tag_index.get(tag, ()))
+            for user_id in user_ids:
+                self._drop_user_context(user_id)
+            
+            # 创建中的上下文尚未登记标签，按其依赖判断是否受影响
+            for user_id in self._context_generations:
+                if tag in self._context_dependencies(user_id):
+                    self._context_generations[user_id] += 1
+        
+        if user_ids:
+            self._logger.debug(f"🗑️ 标签 {tag} 变更，已清除 {len(user_ids)} 个上下文缓存")
+    
     def get_agent_by_name(self, agent_name: str):
         """
         获取指定名称的agent（使用全局assistant manager）
@@ -245,77 +414,92 @@ class PerformanceManager:
         """
         assistant_manager = self.get_assistant_manager()
         
-        # 映射agent名称到管理器方法
-        agent_mapping = {
-            "Triage Agent": assistant_manager.get_triage_agent,
-            "Weather Agent": assistant_manager.get_weather_agent,
-            "News Agent": assistant_manager.get_news_agent,
-            "Recipe Agent": assistant_manager.get_recipe_agent,
-            "Personal Assistant Agent": assistant_manager.get_personal_agent,
-            "Conversation Title Agent": assistant_manager.get_conversation_title_agent,
-        }
+        agent_getter = self._agent_mapping.get(agent_name)
+        if agent_getter is not None:
+            return agent_getter()
         
-        if agent_name in agent_mapping:
-            return agent_mapping[agent_name]()
-        else:
-            # 默认返回任务调度中心
-            self._logger.warning(f"Agent '{agent_name}' 未找到，返回Triage Agent")
-            return assistant_manager.get_triage_agent()
+        # 默认返回任务调度中心
+        self._logger.warning(f"Agent '{agent_name}' 未找到，返回Triage Agent")
+        return assistant_manager.get_triage_agent()
     
     def cleanup_expired_caches(self):
         """清理过期的缓存"""
-        now = datetime.now()
+        now = time.monotonic()
         expired_contexts = []
         
         with self._lock:
-            # 找出过期的上下文缓存
-            for user_id, expiry_time in self._context_cache_expiry.items():
-                if now >= expiry_time:
+            # 只弹出堆顶已过期的条目
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expiry_time, user_id = heapq.heappop(self._expiry_heap)
+                # 忽略已刷新或已失效条目的旧记录
+                if self._context_cache_expiry.get(user_id) == expiry_time:
+                    self._drop_user_context(user_id)
                     expired_contexts.append(user_id)
             
-            # 删除过期的缓存
-            for user_id in expired_contexts:
-                if user_id in self._user_contexts:
-                    del self._user_contexts[user_id]
-                if user_id in self._context_cache_expiry:
-                    del self._context_cache_expiry[user_id]
+            # 失效频繁时堆中旧记录会累积，超过有效条目两倍时重建
+            if len(self._expiry_heap) > 2 * len(self._context_cache_expiry) + 64:
+                self._expiry_heap = [(expiry, uid) for uid, expiry in self._context_cache_expiry.items()]
+                heapq.heapify(self._expiry_heap)
             
             if expired_contexts:
                 self._logger.info(f"🧹 清理了 {len(expired_contexts)} 个过期的用户上下文缓存")
     
     def get_stats(self) -> Dict[str, Any]:
         """获取性能统计信息"""
-        self._stats["total_requests"] += 1
-        self._stats["uptime_seconds"] = int(time.time() - self._stats["start_time"])
-        self._stats["cached_session_managers"] = len(self._session_managers)
-        self._stats["cached_user_contexts"] = len(self._user_contexts)
+        with self._lock:
+            self._stats["total_requests"] += 1
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["cached_session_managers"] = len(self._session_managers)
+            stats["cached_user_contexts"] = len(self._user_contexts)
+        stats["start_time"] = self._start_time
+        stats["uptime_seconds"] = int(time.time() - self._start_time)
         
-        return self._stats.copy()
+        return stats
     
     def close(self):
         """关闭性能管理器，清理资源"""
         with self._lock:
             try:
-                # 关闭所有会话管理器
-                for session_manager in self._session_managers.values():
-                    try:
-                        session_manager.close()
-                    except Exception as e:
-                        self._logger.error(f"关闭会话管理器失败: {e}")
+                # 并行关闭所有会话管理器
+                session_managers = list(self._session_managers.values())
+                if session_managers:
+                    with ThreadPoolExecutor(max_workers=min(32, len(session_managers))) as executor:
+                        list(executor.map(self._safe_close_session_manager, session_managers))
                 
                 # 清理缓存
                 self._session_managers.clear()
                 self._user_contexts.clear()
                 self._context_cache_expiry.clear()
+                self._expiry_heap.clear()
+                self._context_dependency_tags.clear()
+                self._tag_index.clear()
                 
                 self._initialized = False
                 self._assistant_manager_initialized = False
                 self._assistant_manager = None
+                self._agent_mapping = {}
                 
                 self._logger.info("🛑 性能管理器已关闭")
                 
             except Exception as e:
                 self._logger.error(f"关闭性能管理器失败: {e}")
+    
+    def _safe_close_session_manager(self, session_manager: AgentSessionManager):
+        """关闭会话管理器，单个失败不影响其他实例的关闭"""
+        try:
+            session_manager.close()
+        except Exception as e:
+            self._logger.error(f"关闭会话管理器失败: {e}")
+    
+    async def __aenter__(self) -> "PerformanceManager":
+        """异步上下文管理器入口，初始化性能管理器"""
+        if not await self.initialize():
+            raise RuntimeError("性能管理器初始化失败")
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口，确保资源释放"""
+        self.close()
 
 
 # 全局性能管理器实例
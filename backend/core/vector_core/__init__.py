@@ -2,7 +2,6 @@
 Vector Core Module for Chroma Database with OpenAI Embeddings
 """
 
-from .client import ChromaVectorClient
 from .config import VectorConfig
 from .models import VectorDocument, VectorQuery, VectorQueryResult, VectorDeleteFilter, VectorStats
 from .utils import create_collection_name, validate_metadata, generate_document_id
@@ -18,4 +17,13 @@ __all__ = [
     "create_collection_name",
     "validate_metadata",
     "generate_document_id"
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # ChromaVectorClient is loaded on first access so that importing the package
+    # does not pull in chromadb/openai for code paths that never touch vectors
+    if name == "ChromaVectorClient":
+        from .client import ChromaVectorClient
+        return ChromaVectorClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,16 +3,18 @@ Chroma Vector Database Client with OpenAI Embeddings
 """
 
 import os
+import json
+import functools
+import asyncio
+import time
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Any, Iterable, Set
 from datetime import datetime
 
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
-import openai
-
 from .config import VectorConfig
+from .embedding import CachingEmbeddingFunction
 from .models import (
     VectorDocument,
     VectorQuery,
@@ -24,6 +26,7 @@ from .utils import (
     create_collection_name,
     validate_metadata,
     generate_document_id,
+    document_id_hasher,
     build_chroma_filter,
     chunk_text,
     filter_results_by_threshold
@@ -32,19 +35,46 @@ from .utils import (
 
 logger = logging.getLogger(__name__)
 
+# Documents per collection.add() call; each call is one embedding request to OpenAI
+EMBEDDING_BATCH_SIZE = 96
+# Maximum number of concurrent collection.add() calls
+EMBEDDING_MAX_WORKERS = 8
+# Distinct query texts whose embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
 
 class ChromaVectorClient:
     """Chroma Vector Database Client with OpenAI Embeddings"""
     
+    __slots__ = (
+        "config",
+        "_client",
+        "_embedding_function",
+        "_collections",
+        "_collection_locks",
+        "_collection_locks_guard",
+        "_sources_by_user",
+        "_sources_counts",
+        "_executor",
+        "_embed_query",
+    )
+    
     def __init__(self, config: Optional[VectorConfig] = None):
         """Initialize Chroma client"""
         self.config = config or VectorConfig.from_env()
         self._client = None
         self._embedding_function = None
         self._collections = {}  # Cache for collections
-        
-        # Set OpenAI API key
-        openai.api_key = self.config.openai_api_key
+        self._collection_locks: Dict[str, threading.Lock] = {}  # Per-collection creation locks
+        self._collection_locks_guard = threading.Lock()  # Guards the lock map itself
+        self._sources_by_user: Dict[str, Set[str]] = {}  # Known sources per user; missing = unknown
+        self._sources_counts: Dict[str, int] = {}  # Document count each known source set is valid for
+        self._executor = ThreadPoolExecutor(
+            max_workers=EMBEDDING_MAX_WORKERS,
+            thread_name_prefix="vector-add"
+        )
+        # Per-client LRU of query embeddings, keyed by (model, text)
+        self._embed_query = functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(self._compute_query_embedding)
         
         self._init_client()
         self._init_embedding_function()
@@ -58,6 +88,10 @@ class ChromaVectorClient:
 
     def _init_http_client(self):
         """Initialize Chroma HTTP client to connect to a remote server."""
+        # chromadb is imported lazily; it pulls in heavy dependencies at import time
+        import chromadb
+        from chromadb.config import Settings
+        
         try:
             logger.info(f"Initializing Chroma HTTP client to connect to {self.config.chroma_host}:{self.config.chroma_port}...")
             
@@ -80,6 +114,9 @@ class ChromaVectorClient:
 
     def _init_local_client(self):
         """Initialize Chroma client with persistent storage."""
+        import chromadb
+        from chromadb.config import Settings
+        
         try:
             logger.info(f"Initializing Chroma client with local persistence at {self.config.chroma_persist_directory}")
             # Ensure persist directory exists
@@ -102,6 +139,12 @@ class ChromaVectorClient:
     
     def _init_embedding_function(self):
         """Initialize OpenAI embedding function"""
+        import openai
+        from chromadb.utils import embedding_functions
+        
+        # Set OpenAI API key
+        openai.api_key = self.config.openai_api_key
+        
         try:
             self._embedding_function = embedding_functions.OpenAIEmbeddingFunction(
                 api_key=self.config.openai_api_key,
@@ -110,15 +153,45 @@ class ChromaVectorClient:
             
             logger.info(f"OpenAI embedding function initialized with model: {self.config.openai_embedding_model}")
             
+            if self.config.embedding_cache_dir:
+                try:
+                    self._embedding_function = CachingEmbeddingFunction(
+                        self._embedding_function,
+                        model_name=self.config.openai_embedding_model,
+                        cache_dir=self.config.embedding_cache_dir
+                    )
+                    logger.info(f"Embedding cache enabled at {self.config.embedding_cache_dir}")
+                except Exception as e:
+                    # The cache is an optimization only; fall back to direct embedding calls
+                    logger.warning(f"Failed to initialize embedding cache, continuing without it: {e}")
+            
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI embedding function: {e}")
             raise
     
+    def _get_collection_lock(self, collection_name: str) -> threading.Lock:
+        """Get the creation lock for a collection, creating it on first use"""
+        with self._collection_locks_guard:
+            lock = self._collection_locks.get(collection_name)
+            if lock is None:
+                lock = self._collection_locks[collection_name] = threading.Lock()
+            return lock
+    
     def _get_collection(self, user_id: str):
         """Get or create collection for user"""
         collection_name = create_collection_name(self.config.chroma_collection_prefix, user_id)
         
-        if collection_name not in self._collections:
+        # Fast path: cached collection, no locking needed
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        
+        # Slow path: only one caller per collection talks to Chroma
+        with self._get_collection_lock(collection_name):
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                return collection
+            
             try:
                 # Try to get existing collection
                 collection = self._client.get_collection(
@@ -126,6 +199,7 @@ class ChromaVectorClient:
                     embedding_function=self._embedding_function
                 )
                 logger.info(f"Retrieved existing collection: {collection_name}")
+                self._load_sources(user_id, collection)
                 
             except Exception:
                 # Create new collection if it doesn't exist
@@ -135,10 +209,78 @@ class ChromaVectorClient:
                     metadata={"user_id": user_id, "created_at": datetime.now().isoformat()}
                 )
                 logger.info(f"Created new collection: {collection_name}")
+                self._sources_by_user[user_id] = set()
+                self._sources_counts[user_id] = 0
             
             self._collections[collection_name] = collection
+            return collection
+    
+    def _load_sources(self, user_id: str, collection):
+        """Load the persisted source set from collection metadata, if present
         
-        return self._collections[collection_name]
+        The persisted set is only a hint: it is stamped with the document count it
+        was built for, and get_stats() rebuilds it whenever collection.count() differs
+        (e.g. after another worker process added or deleted documents).
+        """
+        metadata = collection.metadata or {}
+        raw_sources = metadata.get("sources")
+        sources_count = metadata.get("sources_count")
+        if raw_sources and isinstance(sources_count, int) and sources_count >= 0:
+            try:
+                self._sources_by_user[user_id] = set(json.loads(raw_sources))
+                self._sources_counts[user_id] = sources_count
+                return
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring malformed sources metadata for user {user_id}")
+        # Unknown until the next get_stats() rebuilds it
+        self._forget_sources(user_id)
+    
+    def _forget_sources(self, user_id: str):
+        """Mark the user's in-memory source set as unknown"""
+        self._sources_by_user.pop(user_id, None)
+        self._sources_counts.pop(user_id, None)
+    
+    def _persist_sources(self, user_id: str, collection, sources: Optional[Set[str]], count: int):
+        """Persist the source set and the document count it is valid for into collection metadata
+        
+        A count of -1 marks the persisted set as stale so that no process trusts it.
+        """
+        try:
+            metadata = dict(collection.metadata or {})
+            metadata["sources"] = json.dumps(sorted(sources)) if sources is not None else ""
+            metadata["sources_count"] = count
+            collection.modify(metadata=metadata)
+        except Exception as e:
+            logger.warning(f"Failed to persist sources for user {user_id}: {e}")
+    
+    def _invalidate_sources(self, user_id: str, collection):
+        """Drop the user's source set in memory and mark the persisted copy as stale"""
+        self._forget_sources(user_id)
+        self._persist_sources(user_id, collection, None, -1)
+    
+    def _record_sources(self, user_id: str, sources: Iterable[str], added: int):
+        """Add newly written sources to the user's known source set
+        
+        Only the in-memory set is updated; it is persisted by the next get_stats()
+        so that adds do not pay an extra collection.modify() round-trip.
+        """
+        known = self._sources_by_user.get(user_id)
+        if known is None:
+            return
+        known.update(sources)
+        self._sources_counts[user_id] += added
+    
+    def _rebuild_sources(self, user_id: str, collection, count: int) -> Set[str]:
+        """Rebuild the user's source set by scanning collection metadata"""
+        results = collection.get(include=["metadatas"])
+        sources = {
+            metadata.get('source', 'default')
+            for metadata in (results['metadatas'] or [])
+        }
+        self._sources_by_user[user_id] = sources
+        self._sources_counts[user_id] = count
+        self._persist_sources(user_id, collection, sources, count)
+        return sources
     
     def add_document(self, document: VectorDocument) -> str:
         """Add a document to the vector database"""
@@ -149,6 +291,9 @@ class ChromaVectorClient:
             if not document.id:
                 document.id = generate_document_id(document.text, document.user_id, document.source)
             
+            if document.created_at is None:
+                document.created_at = datetime.now()
+            
             # Prepare metadata
             metadata = validate_metadata(document.metadata)
             metadata.update({
@@ -163,6 +308,7 @@ class ChromaVectorClient:
                 metadatas=[metadata],
                 ids=[document.id]
             )
+            self._record_sources(document.user_id, (metadata["source"],), 1)
             
             logger.info(f"Added document {document.id} for user {document.user_id}")
             return document.id
@@ -171,6 +317,10 @@ class ChromaVectorClient:
             logger.error(f"Failed to add document: {e}")
             raise
     
+    async def aadd_document(self, document: VectorDocument) -> str:
+        """Async variant of add_document; runs the blocking call in a worker thread"""
+        return await asyncio.to_thread(self.add_document, document)
+    
     def add_documents(self, documents: List[VectorDocument]) -> List[str]:
         """Add multiple documents to the vector database"""
         document_ids = []
@@ -182,6 +332,10 @@ class ChromaVectorClient:
                 user_documents[doc.user_id] = []
             user_documents[doc.user_id].append(doc)
         
+        # One timestamp for the whole batch instead of one per document
+        now = datetime.now()
+        now_iso = now.isoformat()
+        
         # Process documents by user
         for user_id, user_docs in user_documents.items():
             try:
@@ -191,18 +345,31 @@ class ChromaVectorClient:
                 texts = []
                 metadatas = []
                 ids = []
+                # ID hashers pre-fed with the shared "user_id:source:" prefix, one per source
+                id_hashers = {}
                 
                 for doc in user_docs:
                     # Generate document ID if not provided
                     if not doc.id:
-                        doc.id = generate_document_id(doc.text, doc.user_id, doc.source)
+                        id_hasher = id_hashers.get(doc.source)
+                        if id_hasher is None:
+                            id_hasher = id_hashers[doc.source] = document_id_hasher(user_id, doc.source)
+                        digest = id_hasher.copy()
+                        digest.update(doc.text.encode())
+                        doc.id = digest.hexdigest()
+                    
+                    if doc.created_at is None:
+                        doc.created_at = now
+                        created_at = now_iso
+                    else:
+                        created_at = doc.created_at.isoformat()
                     
                     # Prepare metadata
                     metadata = validate_metadata(doc.metadata)
                     metadata.update({
                         "user_id": doc.user_id,
                         "source": doc.source or "default",
-                        "created_at": doc.created_at.isoformat()
+                        "created_at": created_at
                     })
                     
                     texts.append(doc.text)
@@ -211,12 +378,21 @@ class ChromaVectorClient:
                     document_ids.append(doc.id)
                 
                 logger.info(f"Calling collection.add() for {len(texts)} documents. This involves a network call to OpenAI and may take a moment...")
-                # Batch add documents
-                collection.add(
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                # Batch add documents in parallel sub-batches to overlap embedding round-trips
+                futures = [
+                    self._executor.submit(
+                        self._add_batch,
+                        collection,
+                        texts[start:start + EMBEDDING_BATCH_SIZE],
+                        metadatas[start:start + EMBEDDING_BATCH_SIZE],
+                        ids[start:start + EMBEDDING_BATCH_SIZE]
+                    )
+                    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+                ]
+                wait(futures)
+                for future in futures:
+                    future.result()  # Re-raise the first batch failure
+                self._record_sources(user_id, (metadata["source"] for metadata in metadatas), len(ids))
                 
                 logger.info(f"Successfully added {len(user_docs)} documents for user {user_id}")
                 
@@ -226,6 +402,20 @@ class ChromaVectorClient:
         
         return document_ids
     
+    def _add_batch(self, collection, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Add one sub-batch of documents to a collection"""
+        start_time = time.perf_counter()
+        collection.add(
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+        logger.debug(f"Added batch of {len(texts)} documents in {time.perf_counter() - start_time:.3f}s")
+    
+    def _compute_query_embedding(self, model_name: str, query_text: str):
+        """Embed a single query text (wrapped by the _embed_query LRU cache)"""
+        return self._embedding_function([query_text])[0]
+    
     def query_documents(self, query: VectorQuery) -> List[VectorQueryResult]:
         """Query documents using vector similarity"""
         try:
@@ -237,9 +427,10 @@ class ChromaVectorClient:
                 metadata_filter=query.metadata_filter
             )
             
-            # Perform query
+            # Perform query; repeated query texts reuse the cached embedding
+            query_embedding = self._embed_query(self.config.openai_embedding_model, query.query_text)
             results = collection.query(
-                query_texts=[query.query_text],
+                query_embeddings=[query_embedding],
                 n_results=query.limit,
                 where=where_filter,
                 include=["documents", "metadatas", "distances"]
@@ -249,24 +440,23 @@ class ChromaVectorClient:
             query_results = []
             
             if results['ids'] and results['ids'][0]:
-                for i, doc_id in enumerate(results['ids'][0]):
-                    document = results['documents'][0][i]
-                    metadata = results['metadatas'][0][i] if query.include_metadata else None
-                    distance = results['distances'][0][i] if query.include_distances else None
-                    
-                    # Apply similarity threshold if specified
-                    if query.similarity_threshold is not None and distance is not None:
-                        score = 1.0 - distance
-                        if score < query.similarity_threshold:
-                            continue
-                    
-                    result = VectorQueryResult.from_chroma_result(
+                ids = results['ids'][0]
+                documents = results['documents'][0]
+                metadatas = results['metadatas'][0] if query.include_metadata else [None] * len(ids)
+                distances = results['distances'][0] if query.include_distances else [None] * len(ids)
+                threshold = query.similarity_threshold
+                
+                # Apply similarity threshold if specified
+                query_results = [
+                    VectorQueryResult.from_chroma_result(
                         document_id=doc_id,
                         text=document,
                         metadata=metadata,
                         distance=distance
                     )
-                    query_results.append(result)
+                    for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+                    if threshold is None or distance is None or (1.0 - distance) >= threshold
+                ]
             
             logger.info(f"Query returned {len(query_results)} results for user {query.user_id}")
             return query_results
@@ -275,6 +465,10 @@ class ChromaVectorClient:
             logger.error(f"Failed to query documents: {e}")
             raise
     
+    async def aquery_documents(self, query: VectorQuery) -> List[VectorQueryResult]:
+        """Async variant of query_documents; runs the blocking call in a worker thread"""
+        return await asyncio.to_thread(self.query_documents, query)
+    
     def delete_documents(self, delete_filter: VectorDeleteFilter) -> int:
         """Delete documents based on filter criteria"""
         try:
@@ -306,6 +500,10 @@ class ChromaVectorClient:
                     collection.delete(where=where_filter)
                     logger.info(f"Deleted {deleted_count} documents by filter for user {delete_filter.user_id}")
             
+            if deleted_count:
+                # Remaining sources are unknown here and in other processes; rebuilt on the next get_stats()
+                self._invalidate_sources(delete_filter.user_id, collection)
+            
             return deleted_count
             
         except Exception as e:
@@ -341,24 +539,22 @@ class ChromaVectorClient:
         try:
             collection = self._get_collection(user_id)
             
-            # Get all documents for the user
-            results = collection.get(where={"user_id": user_id})
-            
-            total_documents = len(results['ids']) if results['ids'] else 0
+            total_documents = collection.count()
             
-            # Extract unique sources
-            sources = set()
-            if results['metadatas']:
-                for metadata in results['metadatas']:
-                    source = metadata.get('source', 'default')
-                    sources.add(source)
+            sources = self._sources_by_user.get(user_id)
+            if sources is None or self._sources_counts.get(user_id) != total_documents:
+                # Unknown, or the collection changed outside this process
+                sources = self._rebuild_sources(user_id, collection, total_documents)
+            elif (collection.metadata or {}).get("sources_count") != total_documents:
+                # Persist sources added since the last get_stats() in one round-trip
+                self._persist_sources(user_id, collection, sources, total_documents)
             
             collection_name = create_collection_name(self.config.chroma_collection_prefix, user_id)
             
             return VectorStats(
                 total_documents=total_documents,
                 user_id=user_id,
-                sources=list(sources),
+                sources=sorted(sources),
                 collection_name=collection_name
             )
             
@@ -394,6 +590,9 @@ class ChromaVectorClient:
                 validated_metadata = validate_metadata(metadata)
                 existing_metadata.update(validated_metadata)
                 update_data['metadatas'] = [existing_metadata]
+                if 'source' in validated_metadata:
+                    # The old source may no longer be in use; rebuilt on the next get_stats()
+                    self._invalidate_sources(user_id, collection)
             
             # Update document
             collection.update(
@@ -419,6 +618,7 @@ class ChromaVectorClient:
             # Remove from cache
             if collection_name in self._collections:
                 del self._collections[collection_name]
+            self._forget_sources(user_id)
             
             logger.info(f"Cleared all data for user {user_id}")
             return True
@@ -445,4 +645,28 @@ class ChromaVectorClient:
             return {
                 "status": "unhealthy",
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+    
+    def close(self):
+        """Release the Chroma client, worker threads and cached collections"""
+        self._executor.shutdown(wait=True)
+        self._embed_query.cache_clear()
+        
+        if isinstance(self._embedding_function, CachingEmbeddingFunction):
+            try:
+                self._embedding_function.close()
+            except Exception as e:
+                logger.warning(f"Failed to close embedding cache: {e}")
+        
+        self._collections.clear()
+        self._collection_locks.clear()
+        self._sources_by_user.clear()
+        self._sources_counts.clear()
+        self._client = None
+        logger.info("Chroma vector client closed")
+    
+    def __enter__(self) -> "ChromaVectorClient":
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close() 
\ No newline at end of file
@@ -3,13 +3,19 @@ Vector Database Configuration
 """
 
 import os
+import functools
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+from .utils import create_collection_name
 
 
 class VectorConfig(BaseModel):
     """Vector database configuration"""
     
+    # Instances from from_env() are shared process-wide, so they must not be mutated
+    model_config = ConfigDict(frozen=True)
+    
     # OpenAI Configuration
     openai_api_key: str
     openai_embedding_model: str = "text-embedding-3-small"
@@ -29,34 +35,51 @@ class VectorConfig(BaseModel):
     similarity_threshold: float = 0.7
     default_query_limit: int = 10
     
+    # Embedding Cache Configuration (disabled unless a directory is configured)
+    embedding_cache_dir: str = ""
+    
     @classmethod
     def from_env(cls) -> "VectorConfig":
-        """Load configuration from environment variables"""
-        openai_api_key = os.getenv("EMBEDDING_OPENAI_API_KEY")
-        if not openai_api_key:
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise ValueError("OPENAI_API_KEY or EMBEDDING_OPENAI_API_KEY environment variable is required")
-        
-        return cls(
-            openai_api_key=openai_api_key,
-            openai_embedding_model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
-
-            # Chroma config
-            chroma_client_mode=os.getenv("CHROMA_CLIENT_MODE", "http"),
-            chroma_persist_directory=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"),
-            chroma_collection_prefix=os.getenv("CHROMA_COLLECTION_PREFIX", "ai_assistant"),
-
-            # New HTTP client config
-            chroma_host=os.getenv("CHROMA_HOST", "localhost"),
-            chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
-            
-            # Vector Configuration
-            vector_dimension=int(os.getenv("VECTOR_DIMENSION", "1536")),
-            similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.7")),
-            default_query_limit=int(os.getenv("DEFAULT_QUERY_LIMIT", "10"))
-        )
+        """Load configuration from environment variables (cached per process)"""
+        return _build_from_env()
+    
+    @staticmethod
+    def invalidate_cache():
+        """Drop the cached environment configuration, e.g. after changing env vars"""
+        _build_from_env.cache_clear()
     
     def get_collection_name(self, user_id: str) -> str:
         """Generate collection name for user isolation"""
-        return f"{self.chroma_collection_prefix}_user_{user_id}" 
\ No newline at end of file
+        return create_collection_name(self.chroma_collection_prefix, user_id)
+
+
+@functools.lru_cache(maxsize=1)
+def _build_from_env() -> VectorConfig:
+    """Build a VectorConfig from environment variables"""
+    openai_api_key = os.getenv("EMBEDDING_OPENAI_API_KEY")
+    if not openai_api_key:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY or EMBEDDING_OPENAI_API_KEY environment variable is required")
+    
+    return VectorConfig(
+        openai_api_key=openai_api_key,
+        openai_embedding_model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
+
+        # Chroma config
+        chroma_client_mode=os.getenv("CHROMA_CLIENT_MODE", "http"),
+        chroma_persist_directory=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"),
+        chroma_collection_prefix=os.getenv("CHROMA_COLLECTION_PREFIX", "ai_assistant"),
+
+        # New HTTP client config
+        chroma_host=os.getenv("CHROMA_HOST", "localhost"),
+        chroma_port=int(os.getenv("CHROMA_PORT", "8000")),
+        
+        # Vector Configuration
+        vector_dimension=int(os.getenv("VECTOR_DIMENSION", "1536")),
+        similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.7")),
+        default_query_limit=int(os.getenv("DEFAULT_QUERY_LIMIT", "10")),
+        
+        # Embedding cache config
+        embedding_cache_dir=os.getenv("EMBEDDING_CACHE_DIR", "")
+    )
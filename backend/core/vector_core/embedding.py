@@ -0,0 +1,56 @@
+"""
+Embedding Function Adapters
+"""
+
+import hashlib
+import logging
+from typing import Any, List
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachingEmbeddingFunction:
+    """
+    Embedding function adapter with a persistent content-addressed cache.
+
+    Each text is keyed by blake2b(model + text), so identical texts are only
+    sent to the underlying embedding API once, across restarts.
+    Everything other than ``__call__`` is delegated to the wrapped function
+    so Chroma sees the same name/config as the original.
+    """
+
+    def __init__(self, embedding_function: Any, model_name: str, cache_dir: str):
+        # Imported here so diskcache is only required when the cache is enabled
+        import diskcache
+
+        self._embedding_function = embedding_function
+        self._model_prefix = model_name.encode() + b"\x00"
+        self._cache = diskcache.Cache(cache_dir)
+
+    def _cache_key(self, text: str) -> str:
+        """Build the cache key for a text"""
+        digest = hashlib.blake2b(self._model_prefix, digest_size=16)
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def __call__(self, input: List[str]) -> List[Any]:
+        keys = [self._cache_key(text) for text in input]
+        embeddings = [self._cache.get(key) for key in keys]
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self._embedding_function([input[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                self._cache.set(keys[i], embedding)
+
+        logger.debug(f"Embedding cache: {len(input) - len(missing)} hits, {len(missing)} misses")
+        return embeddings
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._embedding_function, name)
+
+    def close(self):
+        """Close the underlying cache"""
+        self._cache.close()
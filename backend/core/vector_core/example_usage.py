@@ -85,8 +85,7 @@ async def main():
         print(f"✓ Added {len(doc_ids)} documents")
         print(f"✓ Document IDs: {doc_ids}\n")
         
-        # 4. Query documents - basic search
-        print("4. Basic Query...")
+        # 4-7. The queries below are independent, so run them concurrently
         query = VectorQuery(
             query_text="programming languages",
             user_id=user1_id,
@@ -97,18 +96,6 @@ async def main():
             include_metadata=True,
             include_distances=True
         )
-        
-        results = client.query_documents(query)
-        print(f"✓ Found {len(results)} results for '{query.query_text}'")
-        for i, result in enumerate(results, 1):
-            print(f"  {i}. ID: {result.id}")
-            print(f"     Text: {result.text[:80]}...")
-            print(f"     Score: {result.score:.3f}")
-            print(f"     Metadata: {result.metadata}")
-            print()
-        
-        # 5. Query with metadata filter
-        print("5. Query with Metadata Filter...")
         query_filtered = VectorQuery(
             query_text="programming",
             user_id=user1_id,
@@ -119,18 +106,6 @@ async def main():
             include_metadata=True,
             include_distances=True
         )
-        
-        results_filtered = client.query_documents(query_filtered)
-        print(f"✓ Found {len(results_filtered)} results with metadata filter")
-        for i, result in enumerate(results_filtered, 1):
-            print(f"  {i}. ID: {result.id}")
-            category = result.metadata.get('category', 'N/A') if result.metadata else 'N/A'
-            print(f"     Category: {category}")
-            print(f"     Score: {result.score:.3f}")
-            print()
-        
-                 # 6. Query with source filter
-        print("6. Query with Source Filter...")
         query_source = VectorQuery(
             query_text="development",
             user_id=user1_id,
@@ -141,16 +116,6 @@ async def main():
             include_metadata=True,
             include_distances=True
         )
-        
-        results_source = client.query_documents(query_source)
-        print(f"✓ Found {len(results_source)} results with source filter")
-        for result in results_source:
-            source = result.metadata.get('source', 'N/A') if result.metadata else 'N/A'
-            print(f"  - ID: {result.id}, Source: {source}")
-        print()
-        
-        # 7. Test user isolation
-        print("7. Testing User Isolation...")
         query_user2 = VectorQuery(
             query_text="programming",
             user_id=user2_id,
@@ -162,7 +127,43 @@ async def main():
             include_distances=True
         )
         
-        results_user2 = client.query_documents(query_user2)
+        results, results_filtered, results_source, results_user2 = await asyncio.gather(
+            client.aquery_documents(query),
+            client.aquery_documents(query_filtered),
+            client.aquery_documents(query_source),
+            client.aquery_documents(query_user2)
+        )
+        
+        # 4. Query documents - basic search
+        print("4. Basic Query...")
+        print(f"✓ Found {len(results)} results for '{query.query_text}'")
+        for i, result in enumerate(results, 1):
+            print(f"  {i}. ID: {result.id}")
+            print(f"     Text: {result.text[:80]}...")
+            print(f"     Score: {result.score:.3f}")
+            print(f"     Metadata: {result.metadata}")
+            print()
+        
+        # 5. Query with metadata filter
+        print("5. Query with Metadata Filter...")
+        print(f"✓ Found {len(results_filtered)} results with metadata filter")
+        for i, result in enumerate(results_filtered, 1):
+            print(f"  {i}. ID: {result.id}")
+            category = result.metadata.get('category', 'N/A') if result.metadata else 'N/A'
+            print(f"     Category: {category}")
+            print(f"     Score: {result.score:.3f}")
+            print()
+        
+        # 6. Query with source filter
+        print("6. Query with Source Filter...")
+        print(f"✓ Found {len(results_source)} results with source filter")
+        for result in results_source:
+            source = result.metadata.get('source', 'N/A') if result.metadata else 'N/A'
+            print(f"  - ID: {result.id}, Source: {source}")
+        print()
+        
+        # 7. Test user isolation
+        print("7. Testing User Isolation...")
         print(f"✓ User2 found {len(results_user2)} results (should be different from user1)")
         for result in results_user2:
             print(f"  - ID: {result.id}, Text: {result.text[:50]}...")
@@ -179,8 +180,10 @@ async def main():
         
         # 9. Get statistics
         print("9. Get Statistics...")
-        stats_user1 = client.get_stats(user1_id)
-        stats_user2 = client.get_stats(user2_id)
+        stats_user1, stats_user2 = await asyncio.gather(
+            asyncio.to_thread(client.get_stats, user1_id),
+            asyncio.to_thread(client.get_stats, user2_id)
+        )
         
         print(f"✓ User1 Stats:")
         print(f"  - Total documents: {stats_user1.total_documents}")
@@ -2,7 +2,7 @@
 Vector Database Models
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Annotated, Dict, List, Optional, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -15,12 +15,7 @@ class VectorDocument(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Custom metadata")
     user_id: str = Field(..., description="User identifier for isolation")
     source: Optional[str] = Field(None, description="Source identifier for filtering")
-    created_at: datetime = Field(default_factory=datetime.now, description="Creation timestamp")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    created_at: Optional[datetime] = Field(None, description="Creation timestamp (set on insert when omitted)")
 
 
 class VectorQuery(BaseModel):
@@ -28,8 +23,10 @@ class VectorQuery(BaseModel):
     
     query_text: str = Field(..., description="Query text to search for")
     user_id: str = Field(..., description="User identifier for isolation")
-    limit: int = Field(10, ge=1, le=100, description="Maximum number of results")
-    similarity_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Similarity threshold")
+    limit: Annotated[int, Field(ge=1, le=100, description="Maximum number of results")] = 10
+    similarity_threshold: Annotated[
+        Optional[float], Field(ge=0.0, le=1.0, description="Similarity threshold")
+    ] = None
     metadata_filter: Optional[Dict[str, Any]] = Field(None, description="Metadata filter conditions")
     source_filter: Optional[str] = Field(None, description="Source filter")
     include_metadata: bool = Field(True, description="Whether to include metadata in results")
@@ -53,12 +50,12 @@ class VectorQueryResult(BaseModel):
         metadata: Optional[Dict[str, Any]] = None,
         distance: Optional[float] = None
     ) -> "VectorQueryResult":
-        """Create result from Chroma query response"""
+        """Create result from Chroma query response (already typed, so validation is skipped)"""
         score = None
         if distance is not None:
             score = 1.0 - distance  # Convert distance to similarity score
         
-        return cls(
+        return cls.model_construct(
             id=document_id,
             text=text,
             metadata=metadata,
@@ -2,19 +2,74 @@
 Vector Database Utilities
 """
 
-import re
-import hashlib
-from typing import Dict, Any, Optional, List
+import string
+import functools
+from bisect import bisect_left
+from typing import Dict, Any, Optional, List, Iterator, Callable
 from datetime import datetime
 
+import xxhash
 
+
+_ALLOWED_NAME_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+
+
+class _NameTranslationTable(dict):
+    """str.translate table mapping every char outside [a-zA-Z0-9_] to '_'.
+
+    Entries are filled in on first sight, so later lookups stay in C.
+    """
+
+    def __missing__(self, codepoint: int) -> int:
+        mapped = codepoint if chr(codepoint) in _ALLOWED_NAME_CHARS else ord("_")
+        self[codepoint] = mapped
+        return mapped
+
+
+_NAME_TRANSLATION_TABLE = _NameTranslationTable()
+
+
+def _sanitize_name(value: str) -> str:
+    """Replace chars that are not valid in Chroma names with underscores"""
+    return value.translate(_NAME_TRANSLATION_TABLE)
+
+
+@functools.lru_cache(maxsize=4096)
 def create_collection_name(prefix: str, user_id: str) -> str:
     """Create a valid collection name for user isolation"""
     # Chroma collection names must be alphanumeric with underscores
-    sanitized_user_id = re.sub(r'[^a-zA-Z0-9_]', '_', user_id)
+    sanitized_user_id = _sanitize_name(user_id)
     return f"{prefix}_user_{sanitized_user_id}"
 
 
+def _convert_metadata_value(value: Any) -> Any:
+    """Convert a metadata value to a Chroma-supported type (isinstance-based, handles subclasses)"""
+    # Validate value types (Chroma supports str, int, float, bool)
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None:
+        return ""
+    # Convert other types to string
+    return str(value)
+
+
+def _keep_metadata_value(value: Any) -> Any:
+    return value
+
+
+# Exact-type fast path for the common value types; anything else goes through _convert_metadata_value
+_METADATA_VALUE_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    str: _keep_metadata_value,
+    int: _keep_metadata_value,
+    float: _keep_metadata_value,
+    bool: _keep_metadata_value,
+    datetime: datetime.isoformat,
+    type(None): lambda value: "",
+}
+
+
 def validate_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     """Validate and sanitize metadata for Chroma storage"""
     if not metadata:
@@ -26,82 +81,117 @@ def validate_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
         # Ensure key is string and valid
         if not isinstance(key, str):
             continue
-            
-        # Sanitize key name
-        sanitized_key = re.sub(r'[^a-zA-Z0-9_]', '_', key)
         
-        # Validate value types (Chroma supports str, int, float, bool)
-        if isinstance(value, (str, int, float, bool)):
-            validated_metadata[sanitized_key] = value
-        elif isinstance(value, datetime):
-            validated_metadata[sanitized_key] = value.isoformat()
-        elif value is None:
-            validated_metadata[sanitized_key] = ""
-        else:
-            # Convert other types to string
-            validated_metadata[sanitized_key] = str(value)
+        convert = _METADATA_VALUE_CONVERTERS.get(type(value), _convert_metadata_value)
+        validated_metadata[_sanitize_name(key)] = convert(value)
     
     return validated_metadata
 
 
+def document_id_hasher(user_id: str, source: Optional[str] = None) -> "xxhash.xxh3_128":
+    """
+    Return a hasher pre-fed with the "user_id:source:" prefix of generate_document_id.
+    
+    Batch callers can build it once per (user, source) and .copy() it per document.
+    """
+    digest = xxhash.xxh3_128()
+    digest.update(user_id.encode())
+    digest.update(b":")
+    digest.update((source or "default").encode())
+    digest.update(b":")
+    return digest
+
+
 def generate_document_id(text: str, user_id: str, source: Optional[str] = None) -> str:
     """Generate a unique document ID based on content and user"""
-    content = f"{user_id}:{source or 'default'}:{text}"
-    return hashlib.md5(content.encode()).hexdigest()
+    # Non-cryptographic dedup key: XXH3-128 keeps the 32 hex char format of the former MD5 ids
+    digest = document_id_hasher(user_id, source)
+    digest.update(text.encode())
+    return digest.hexdigest()
 
 
 def build_chroma_filter(
     source_filter: Optional[str] = None,
-    metadata_filter: Optional[Dict[str, Any]] = None
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    *,
+    already_validated: bool = False
 ) -> Optional[Dict[str, Any]]:
-    """Build a Chroma-compatible filter for handling multiple conditions."""
-    conditions = []
+    """
+    Build a Chroma-compatible filter for handling multiple conditions.
+    
+    Pass already_validated=True when metadata_filter has already been through
+    validate_metadata to skip sanitizing it again.
+    """
+    if metadata_filter and not already_validated:
+        metadata_filter = validate_metadata(metadata_filter)
 
-    if source_filter:
-        conditions.append({"source": {"$eq": source_filter}})
+    # Single-condition fast paths avoid building the intermediate list
+    if not metadata_filter:
+        return {"source": {"$eq": source_filter}} if source_filter else None
 
-    if metadata_filter:
-        validated_metadata = validate_metadata(metadata_filter)
-        for key, value in validated_metadata.items():
-            conditions.append({key: {"$eq": value}})
+    if not source_filter and len(metadata_filter) == 1:
+        (key, value), = metadata_filter.items()
+        return {key: {"$eq": value}}
 
-    if not conditions:
-        return None
-    
-    if len(conditions) == 1:
-        return conditions[0]
+    conditions = [{"source": {"$eq": source_filter}}] if source_filter else []
+    conditions.extend({key: {"$eq": value}} for key, value in metadata_filter.items())
 
     return {"$and": conditions}
 
 
+def _sentence_end_positions(text: str) -> List[int]:
+    """Return the indices of all '.' characters in text, in ascending order"""
+    positions = []
+    position = text.find('.')
+    while position != -1:
+        positions.append(position)
+        position = text.find('.', position + 1)
+    return positions
+
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """Split text into chunks for better vector storage"""
-    if len(text) <= chunk_size:
-        return [text]
+    return list(iter_chunks(text, chunk_size, overlap))
+
+
+def iter_chunks(text: str, chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """Split text into chunks for better vector storage, yielding them lazily"""
+    text_length = len(text)
+    if text_length <= chunk_size:
+        yield text
+        return
+    
+    # Sentence boundaries are located once up front instead of re-scanning per chunk
+    sentence_ends = _sentence_end_positions(text)
+    
+    # Without any '.' (e.g. CJK text) every chunk is a fixed window, so skip the boundary search
+    if not sentence_ends and chunk_size > overlap:
+        for start in range(0, text_length, chunk_size - overlap):
+            chunk = text[start:start + chunk_size].strip()
+            if chunk:
+                yield chunk
+        return
     
-    chunks = []
     start = 0
     
-    while start < len(text):
+    while start < text_length:
         end = start + chunk_size
         
         # Try to find a good break point (sentence end)
-        if end < len(text):
+        if end < text_length:
             # Look for sentence endings within the last 100 characters
             search_start = max(end - 100, start)
-            sentence_end = text.rfind('.', search_start, end)
-            if sentence_end > start:
-                end = sentence_end + 1
+            index = bisect_left(sentence_ends, end) - 1
+            if index >= 0 and sentence_ends[index] >= search_start and sentence_ends[index] > start:
+                end = sentence_ends[index] + 1
         
         chunk = text[start:end].strip()
         if chunk:
-            chunks.append(chunk)
+            yield chunk
         
         start = end - overlap
-        if start >= len(text):
+        if start >= text_length:
             break
-    
-    return chunks
 
 
 def calculate_similarity_score(distance: float) -> float:
@@ -115,16 +205,24 @@ def filter_results_by_threshold(
     distance_index: int = 2
 ) -> List[tuple]:
     """Filter results by similarity threshold"""
-    filtered = []
+    # numpy is imported lazily to keep package import cheap (see client.py)
+    import numpy as np
+    
+    if not results:
+        return []
     
-    for result in results:
-        if len(result) > distance_index and result[distance_index] is not None:
-            distance = result[distance_index]
-            score = calculate_similarity_score(distance)
-            if score >= threshold:
-                filtered.append(result)
-        else:
-            # Include results without distance information
-            filtered.append(result)
+    # Results without distance information become NaN and are always kept
+    distances = np.fromiter(
+        (
+            result[distance_index]
+            if len(result) > distance_index and result[distance_index] is not None
+            else np.nan
+            for result in results
+        ),
+        dtype=np.float64,
+        count=len(results)
+    )
+    scores = np.clip(1.0 - distances, 0.0, None)
+    keep = np.isnan(distances) | (scores >= threshold)
     
-    return filtered 
\ No newline at end of file
+    return [results[i] for i in np.flatnonzero(keep)]
@@ -35,7 +35,12 @@ message = WebSocketMessage(
 ```
 """
 
+import functools
+import importlib
+from types import MappingProxyType
+
 # 导入数据模型 (Import data models)
+# 模型模块很轻量，且 WebSocketConfig 需要 MessageType，因此直接导入
 from .models import (
     MessageType,
     ConnectionStatus,
@@ -47,39 +52,56 @@ from .models import (
     WebSocketError
 )
 
-# 导入连接管理器 (Import connection manager)
-from .manager import (
-    WebSocketConnectionManager,
-    connection_manager  # 全局单例实例 (Global singleton instance)
-)
-
-# 导入消息处理器 (Import message handler)
-from .handler import (
-    WebSocketMessageHandler,
-    create_message_handler
-)
-
-# 导入工具函数 (Import utility functions)
-from .utils import (
-    generate_connection_id,
-    generate_room_id,
-    validate_message,
-    parse_websocket_message,
-    serialize_message,
-    extract_query_params,
-    validate_user_info,
-    create_error_message,
-    format_connection_info,
-    calculate_connection_duration,
-    is_connection_healthy,
-    generate_message_hash,
-    filter_connections_by_criteria,
-    create_system_notification,
-    sanitize_user_input,
-    get_client_info_from_headers,
-    create_message_from_template,
-    MESSAGE_TEMPLATES
-)
+# 连接管理器、消息处理器和工具函数按需加载 (PEP 562)，
+# 全局连接管理器单例也在首次访问时才创建
+# (Manager, handler and utils are loaded on first access via PEP 562)
+_LAZY_EXPORTS = {
+    # 连接管理器 (Connection manager)
+    "WebSocketConnectionManager": ".manager",
+    "connection_manager": ".manager",  # 全局单例实例 (Global singleton instance)
+    
+    # 消息处理器 (Message handler)
+    "WebSocketMessageHandler": ".handler",
+    "create_message_handler": ".handler",
+    
+    # 工具函数 (Utility functions)
+    "generate_connection_id": ".utils",
+    "generate_room_id": ".utils",
+    "validate_message": ".utils",
+    "parse_websocket_message": ".utils",
+    "parse_websocket_frame": ".utils",
+    "serialize_message": ".utils",
+    "extract_query_params": ".utils",
+    "validate_user_info": ".utils",
+    "create_error_message": ".utils",
+    "create_error_bytes": ".utils",
+    "format_connection_info": ".utils",
+    "calculate_connection_duration": ".utils",
+    "is_connection_healthy": ".utils",
+    "generate_message_hash": ".utils",
+    "filter_connections_by_criteria": ".utils",
+    "create_system_notification": ".utils",
+    "sanitize_user_input": ".utils",
+    "get_client_info_from_headers": ".utils",
+    "create_message_from_template": ".utils",
+    "MESSAGE_TEMPLATES": ".utils",
+    "MAX_FRAME_BYTES": ".utils",
+}
+
+
+def __getattr__(name):
+    """按需加载导出对象 (Lazily load exported objects)"""
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # 缓存到模块命名空间，后续访问不再经过 __getattr__ (Cache for subsequent lookups)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
 
 # 模块版本信息 (Module version info)
 __version__ = "1.0.0"
@@ -108,10 +130,12 @@ __all__ = [
     "generate_room_id",
     "validate_message",
     "parse_websocket_message",
+    "parse_websocket_frame",
     "serialize_message",
     "extract_query_params",
     "validate_user_info",
     "create_error_message",
+    "create_error_bytes",
     "format_connection_info",
     "calculate_connection_duration",
     "is_connection_healthy",
@@ -122,16 +146,15 @@ __all__ = [
     "get_client_info_from_headers",
     "create_message_from_template",
     "MESSAGE_TEMPLATES",
+    "MAX_FRAME_BYTES",
     
     # 版本信息 (Version Info)
     "__version__",
     "__author__"
 ]
 
-# 模块初始化日志 (Module initialization logging)
 import logging
 logger = logging.getLogger(__name__)
-logger.info(f"WebSocket 核心模块已加载 (WebSocket Core Module loaded) - Version {__version__}")
 
 # 快速启动函数 (Quick start functions)
 def create_websocket_server_components():
@@ -141,6 +164,9 @@ def create_websocket_server_components():
     Returns:
         tuple: (连接管理器, 消息处理器) (Connection manager, Message handler)
     """
+    from .manager import connection_manager
+    from .handler import create_message_handler
+    
     manager = connection_manager
     handler = create_message_handler(manager)
     
@@ -148,15 +174,19 @@ def create_websocket_server_components():
     return manager, handler
 
 
+@functools.cache
 def get_default_message_handlers():
     """
     获取默认的消息处理器映射 (Get default message handler mappings)
     
+    结果在进程内缓存：连接管理器是全局单例，处理器映射在进程生命周期内保持有效
+    (Cached per process: the connection manager is a singleton, so the mapping stays valid)
+    
     Returns:
-        dict: 消息类型到处理函数的映射 (Message type to handler function mapping)
+        Mapping: 消息类型到处理函数的只读映射 (Read-only message type to handler function mapping)
     """
     manager, handler = create_websocket_server_components()
-    return {
+    return MappingProxyType({
         MessageType.PING: handler.handle_ping,
         MessageType.PONG: handler.handle_pong,
         MessageType.CONNECT: handler.handle_connect,
@@ -168,7 +198,7 @@ def get_default_message_handlers():
         MessageType.AI_RESPONSE: handler.handle_ai_response,
         MessageType.AI_THINKING: handler.handle_ai_thinking,
         MessageType.AI_ERROR: handler.handle_ai_error
-    }
+    })
 
 
 # 常用配置常量 (Common configuration constants)
@@ -187,11 +217,14 @@ class WebSocketConfig:
     # 最大消息长度 (Maximum message length)
     MAX_MESSAGE_LENGTH = 10000
     
+    # 命令帧最大字节数，超出时拒绝处理 (Maximum command frame size; larger commands are rejected)
+    MAX_COMMAND_BYTES = 4 * 1024
+    
     # 最大房间成员数 (Maximum room members)
     MAX_ROOM_MEMBERS = 100
     
-    # 支持的消息类型 (Supported message types)
-    SUPPORTED_MESSAGE_TYPES = [e.value for e in MessageType]
+    # 支持的消息类型，frozenset 提供 O(1) 成员检查 (Supported message types; frozenset for O(1) membership checks)
+    SUPPORTED_MESSAGE_TYPES = frozenset(e.value for e in MessageType)
     
     # 系统用户ID (System user ID)
     SYSTEM_USER_ID = "system"
@@ -3,25 +3,39 @@ WebSocket 消息处理器 (WebSocket Message Handler)
 处理不同类型的 WebSocket 消息，包括系统消息、用户消息、AI 消息等
 """
 
-import asyncio
-import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+import sys
+import uuid
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Awaitable, Mapping
 
 from .models import (
     WebSocketMessage, 
     MessageType, 
-    UserInfo, 
-    ConnectionInfo,
-    RoomInfo,
-    WebSocketError
+    RoomInfo
 )
-from .manager import WebSocketConnectionManager
+from .manager import WebSocketConnectionManager, _now, _now_iso
 
 # 配置日志 (Configure logging)
 logger = logging.getLogger(__name__)
 
+# 共享的只读空参数 (Shared read-only empty args, avoids allocating {} per command)
+_EMPTY_DICT: Mapping[str, Any] = MappingProxyType({})
+
+# 固定部分的系统通知内容，发送时只补充变化的字段 (Fixed parts of system notification content; only changing fields are added per send)
+_WELCOME_BASE: Mapping[str, Any] = MappingProxyType({
+    "type": "welcome",
+    "message": "欢迎连接到 AI 个人日常助手！(Welcome to AI Personal Daily Assistant!)",
+})
+_USER_OFFLINE_BASE: Mapping[str, Any] = MappingProxyType({"type": "user_offline"})
+
+# 命令处理器签名 (Command handler signature): (connection_id, message, args)
+CommandHandler = Callable[[str, WebSocketMessage, Mapping[str, Any]], Awaitable[None]]
+
+# 命令参数的最大键数，超出时直接拒绝；命令帧总大小由 WebSocketConfig.MAX_COMMAND_BYTES 限制
+# (Maximum keys in command args; larger commands are rejected. Total frame size is capped by WebSocketConfig.MAX_COMMAND_BYTES)
+MAX_COMMAND_ARGS = 32
+
 
 class WebSocketMessageHandler:
     """
@@ -41,7 +55,36 @@ class WebSocketMessageHandler:
             connection_manager: WebSocket 连接管理器 (WebSocket connection manager)
         """
         self.connection_manager = connection_manager
-        self.command_handlers: Dict[str, callable] = {}
+        self.command_handlers: Dict[str, CommandHandler] = {}
+        
+        # 预构建的错误消息模板，发送时只替换 id、内容和时间戳，跳过 pydantic 校验
+        # (Prebuilt error message template; only id, content and timestamp change per send)
+        self._error_template = WebSocketMessage.model_construct(
+            type=MessageType.ERROR,
+            content=None,
+            sender_id="system",
+            receiver_id=None,
+            room_id=None,
+            timestamp=None,
+            metadata={}
+        )
+        
+        # 预编码的欢迎消息和 PONG 帧模板 (Pre-encoded welcome and PONG frame templates)
+        self._welcome_template = self.connection_manager.build_frame_template(MessageType.NOTIFICATION, _WELCOME_BASE, "system")
+        self._pong_template = self.connection_manager.build_frame_template(MessageType.PONG, _EMPTY_DICT, None)
+        
+        # 内置命令分发表，与自定义处理器签名一致 (Built-in command dispatch table, same signature as custom handlers)
+        self._builtin_commands: Dict[str, CommandHandler] = {
+            "join_room": self._handle_join_room_command,
+            "leave_room": self._handle_leave_room_command,
+            "create_room": self._handle_create_room_command,
+            "list_rooms": self._handle_list_rooms_command,
+            "get_connection_info": self._handle_get_connection_info_command,
+        }
+        
+        # 合并后的只读命令分发表，注册/注销时重建 (Merged read-only command table, rebuilt on register/unregister)
+        self._command_table: Mapping[str, CommandHandler] = MappingProxyType({})
+        self._rebuild_command_table()
         
         # 注册默认消息处理器 (Register default message handlers)
         self._register_default_handlers()
@@ -51,21 +94,21 @@ class WebSocketMessageHandler:
     def _register_default_handlers(self):
         """注册默认的消息处理器 (Register default message handlers)"""
         # 系统消息处理器 (System message handlers)
-        self.connection_manager.register_message_handler(MessageType.PING, self.handle_ping)
-        self.connection_manager.register_message_handler(MessageType.PONG, self.handle_pong)
-        self.connection_manager.register_message_handler(MessageType.CONNECT, self.handle_connect)
-        self.connection_manager.register_message_handler(MessageType.DISCONNECT, self.handle_disconnect)
+        self.connection_manager.register_message_handler(MessageType.PING.value, self.handle_ping)
+        self.connection_manager.register_message_handler(MessageType.PONG.value, self.handle_pong)
+        self.connection_manager.register_message_handler(MessageType.CONNECT.value, self.handle_connect)
+        self.connection_manager.register_message_handler(MessageType.DISCONNECT.value, self.handle_disconnect)
         
         # 用户消息处理器 (User message handlers)
-        self.connection_manager.register_message_handler(MessageType.CHAT, self.handle_chat)
-        self.connection_manager.register_message_handler(MessageType.NOTIFICATION, self.handle_notification)
-        self.connection_manager.register_message_handler(MessageType.COMMAND, self.handle_command)
-        self.connection_manager.register_message_handler(MessageType.DATA, self.handle_data)
+        self.connection_manager.register_message_handler(MessageType.CHAT.value, self.handle_chat)
+        self.connection_manager.register_message_handler(MessageType.NOTIFICATION.value, self.handle_notification)
+        self.connection_manager.register_message_handler(MessageType.COMMAND.value, self.handle_command)
+        self.connection_manager.register_message_handler(MessageType.DATA.value, self.handle_data)
         
         # AI 消息处理器 (AI message handlers)
-        self.connection_manager.register_message_handler(MessageType.AI_RESPONSE, self.handle_ai_response)
-        self.connection_manager.register_message_handler(MessageType.AI_THINKING, self.handle_ai_thinking)
-        self.connection_manager.register_message_handler(MessageType.AI_ERROR, self.handle_ai_error)
+        self.connection_manager.register_message_handler(MessageType.AI_RESPONSE.value, self.handle_ai_response)
+        self.connection_manager.register_message_handler(MessageType.AI_THINKING.value, self.handle_ai_thinking)
+        self.connection_manager.register_message_handler(MessageType.AI_ERROR.value, self.handle_ai_error)
 
     async def handle_ping(self, connection_id: str, message: WebSocketMessage):
         """
@@ -75,18 +118,11 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 心跳消息 (Ping message)
         """
-        # 发送 PONG 响应 (Send PONG response)
-        pong_message = WebSocketMessage(
-            type=MessageType.PONG,
-            content={"timestamp": datetime.utcnow().isoformat()},
-            sender_id=None,
-            receiver_id=None,
-            room_id=None,
-            timestamp=datetime.utcnow()
-        )
-        
-        await self.connection_manager.send_to_connection(connection_id, pong_message)
-        logger.debug(f"发送 PONG 响应 (Sent PONG response): {connection_id}")
+        # 发送 PONG 响应，只需填入 id 和时间戳 (Send PONG response; only id and timestamps are filled in)
+        timestamp = _now_iso()
+        frame = self._pong_template % (uuid.uuid4(), timestamp, timestamp)
+        await self.connection_manager.send_raw_to_connection(connection_id, frame)
+        logger.debug("发送 PONG 响应 (Sent PONG response): %s", connection_id)
 
     async def handle_pong(self, connection_id: str, message: WebSocketMessage):
         """
@@ -98,7 +134,7 @@ class WebSocketMessageHandler:
         """
         # 更新连接的最后心跳时间 (Update connection's last ping time)
         await self.connection_manager.handle_pong(connection_id)
-        logger.debug(f"接收到 PONG 响应 (Received PONG response): {connection_id}")
+        logger.debug("接收到 PONG 响应 (Received PONG response): %s", connection_id)
 
     async def handle_connect(self, connection_id: str, message: WebSocketMessage):
         """
@@ -108,23 +144,12 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 连接消息 (Connect message)
         """
-        logger.info(f"处理连接消息 (Handling connect message): {connection_id}")
-        
-        # 发送欢迎消息 (Send welcome message)
-        welcome_message = WebSocketMessage(
-            type=MessageType.NOTIFICATION,
-            content={
-                "type": "welcome",
-                "message": "欢迎连接到 AI 个人日常助手！(Welcome to AI Personal Daily Assistant!)",
-                "timestamp": datetime.utcnow().isoformat()
-            },
-            sender_id="system",
-            receiver_id=None,
-            room_id=None,
-            timestamp=datetime.utcnow()
-        )
+        logger.info("处理连接消息 (Handling connect message): %s", connection_id)
         
-        await self.connection_manager.send_to_connection(connection_id, welcome_message)
+        # 发送欢迎消息，只需填入 id 和时间戳 (Send welcome message; only id and timestamps are filled in)
+        timestamp = _now_iso()
+        frame = self._welcome_template % (uuid.uuid4(), timestamp, timestamp)
+        await self.connection_manager.send_raw_to_connection(connection_id, frame)
 
     async def handle_disconnect(self, connection_id: str, message: WebSocketMessage):
         """
@@ -134,29 +159,31 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 断开连接消息 (Disconnect message)
         """
-        logger.info(f"处理断开连接消息 (Handling disconnect message): {connection_id}")
+        logger.info("处理断开连接消息 (Handling disconnect message): %s", connection_id)
         
         # 获取连接信息 (Get connection info)
         conn_info = await self.connection_manager.get_connection_info(connection_id)
         if conn_info and conn_info.user_info:
             # 通知其他用户此用户已离线 (Notify other users that this user is offline)
-            offline_message = WebSocketMessage(
+            offline_message = WebSocketMessage.model_construct(
                 type=MessageType.NOTIFICATION,
                 content={
-                    "type": "user_offline",
+                    **_USER_OFFLINE_BASE,
                     "user_id": conn_info.user_info.user_id,
                     "username": conn_info.user_info.username,
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": _now_iso()
                 },
                 sender_id="system",
                 receiver_id=None,
                 room_id=None,
-                timestamp=datetime.utcnow()
+                timestamp=_now()
             )
             
-            await self.connection_manager.broadcast_to_all(
-                offline_message, 
-                exclude_connections=[connection_id]
+            # 只序列化一次，所有连接共享同一帧 (Serialize once, share the frame across connections)
+            frame = self.connection_manager.encode_message(offline_message)
+            await self.connection_manager.broadcast_raw_to_all(
+                frame,
+                exclude_connections=frozenset((connection_id,))
             )
 
     async def handle_chat(self, connection_id: str, message: WebSocketMessage):
@@ -167,21 +194,13 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 聊天消息 (Chat message)
         """
-        logger.info(f"处理聊天消息 (Handling chat message): {connection_id}")
+        logger.debug("处理聊天消息 (Handling chat message): %s", connection_id)
         
         # 获取发送者信息 (Get sender info)
         conn_info = await self.connection_manager.get_connection_info(connection_id)
         if not conn_info or not conn_info.user_info:
             # 发送错误消息 (Send error message)
-            error_message = WebSocketMessage(
-                type=MessageType.ERROR,
-                content={"error": "未认证用户无法发送聊天消息 (Unauthenticated user cannot send chat messages)"},
-                sender_id="system",
-                receiver_id=None,
-                room_id=None,
-                timestamp=datetime.utcnow()
-            )
-            await self.connection_manager.send_to_connection(connection_id, error_message)
+            await self._send_error(connection_id, "未认证用户无法发送聊天消息 (Unauthenticated user cannot send chat messages)")
             return
 
         # 设置发送者信息 (Set sender info)
@@ -195,8 +214,9 @@ class WebSocketMessageHandler:
             # 房间消息 (Room message)
             await self.connection_manager.broadcast_to_room(message.room_id, message)
         else:
-            # 全局消息 (Global message)
-            await self.connection_manager.broadcast_to_all(message, exclude_connections=[connection_id])
+            # 全局消息，只序列化一次 (Global message, serialized once)
+            frame = self.connection_manager.encode_message(message)
+            await self.connection_manager.broadcast_raw_to_all(frame, exclude_connections=frozenset((connection_id,)))
 
     async def handle_notification(self, connection_id: str, message: WebSocketMessage):
         """
@@ -206,12 +226,13 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 通知消息 (Notification message)
         """
-        logger.info(f"处理通知消息 (Handling notification message): {connection_id}")
+        logger.debug("处理通知消息 (Handling notification message): %s", connection_id)
         
         # 通知消息通常由系统发送，这里记录日志 (Notification messages are usually sent by system, log here)
-        if isinstance(message.content, dict) and "type" in message.content:
-            notification_type = message.content["type"]
-            logger.info(f"通知类型 (Notification type): {notification_type}")
+        content = message.content
+        notification_type = content.get("type") if isinstance(content, dict) else None
+        if notification_type is not None:
+            logger.debug("通知类型 (Notification type): %s", notification_type)
 
     async def handle_command(self, connection_id: str, message: WebSocketMessage):
         """
@@ -221,49 +242,26 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 命令消息 (Command message)
         """
-        logger.info(f"处理命令消息 (Handling command message): {connection_id}")
+        logger.debug("处理命令消息 (Handling command message): %s", connection_id)
         
-        if not isinstance(message.content, dict) or "command" not in message.content:
-            error_message = WebSocketMessage(
-                type=MessageType.ERROR,
-                content={"error": "无效的命令格式 (Invalid command format)"},
-                sender_id="system",
-                receiver_id=None,
-                room_id=None,
-                timestamp=datetime.utcnow()
-            )
-            await self.connection_manager.send_to_connection(connection_id, error_message)
+        content = message.content
+        command = content.get("command") if isinstance(content, dict) else None
+        if command is None:
+            await self._send_error(connection_id, "无效的命令格式 (Invalid command format)")
             return
 
-        command = message.content["command"]
-        args = message.content.get("args", {})
-        
-        # 处理内置命令 (Handle built-in commands)
-        if command == "join_room":
-            await self._handle_join_room_command(connection_id, args)
-        elif command == "leave_room":
-            await self._handle_leave_room_command(connection_id, args)
-        elif command == "create_room":
-            await self._handle_create_room_command(connection_id, args)
-        elif command == "list_rooms":
-            await self._handle_list_rooms_command(connection_id, args)
-        elif command == "get_connection_info":
-            await self._handle_get_connection_info_command(connection_id, args)
+        args = content.get("args") or _EMPTY_DICT
+        if not isinstance(args, Mapping) or len(args) > MAX_COMMAND_ARGS:
+            await self._send_error(connection_id, "无效的命令格式 (Invalid command format)")
+            return
+        
+        # 单次查找合并表，直接修改 command_handlers 的调用方回退到原字典
+        # (One lookup in the merged table; callers mutating command_handlers directly fall back to the dict)
+        handler = self._command_table.get(command) or self.command_handlers.get(command)
+        if handler:
+            await handler(connection_id, message, args)
         else:
-            # 查找自定义命令处理器 (Look for custom command handler)
-            handler = self.command_handlers.get(command)
-            if handler:
-                await handler(connection_id, message, args)
-            else:
-                error_message = WebSocketMessage(
-                    type=MessageType.ERROR,
-                    content={"error": f"未知命令 (Unknown command): {command}"},
-                    sender_id="system",
-                    receiver_id=None,
-                    room_id=None,
-                    timestamp=datetime.utcnow()
-                )
-                await self.connection_manager.send_to_connection(connection_id, error_message)
+            await self._send_error(connection_id, f"未知命令 (Unknown command): {command}")
 
     async def handle_data(self, connection_id: str, message: WebSocketMessage):
         """
@@ -273,15 +271,16 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: 数据消息 (Data message)
         """
-        logger.info(f"处理数据消息 (Handling data message): {connection_id}")
+        logger.debug("处理数据消息 (Handling data message): %s", connection_id)
         
         # 数据消息可以用于传输任意结构化数据 (Data messages can be used to transmit arbitrary structured data)
         # 这里可以根据具体业务需求进行处理 (Process according to specific business requirements)
         
         # 记录数据消息的基本信息 (Log basic info of data message)
-        if isinstance(message.content, dict) and "data_type" in message.content:
-            data_type = message.content["data_type"]
-            logger.info(f"数据类型 (Data type): {data_type}")
+        content = message.content
+        data_type = content.get("data_type") if isinstance(content, dict) else None
+        if data_type is not None:
+            logger.debug("数据类型 (Data type): %s", data_type)
 
     async def handle_ai_response(self, connection_id: str, message: WebSocketMessage):
         """
@@ -291,7 +290,7 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: AI 响应消息 (AI response message)
         """
-        logger.info(f"处理 AI 响应消息 (Handling AI response message): {connection_id}")
+        logger.debug("处理 AI 响应消息 (Handling AI response message): %s", connection_id)
         
         # AI 响应消息通常发送给特定用户或房间 (AI response messages are usually sent to specific users or rooms)
         if message.receiver_id:
@@ -309,7 +308,7 @@ class WebSocketMessageHandler:
             connection_id: 连接ID (Connection ID)
             message: AI 思考消息 (AI thinking message)
         """
-        logger.info(f"处理 AI 思考消息 (Handling AI thinking message): {connection_id}")
+        logger.debug("处理 AI 思考消息 (Handling AI thinking message): %s", connection_id)
         
         # AI 思考消息表示 AI 正在处理请求 (AI thinking messages indicate AI is processing request)
         # 可以显示加载状态或进度信息 (Can display loading status or progress information)
@@ -327,26 +326,34 @@ class WebSocketMessageHandler:
         # AI 错误消息表示 AI 处理过程中出现了错误 (AI error messages indicate errors during AI processing)
         # 应该通知用户并记录错误日志 (Should notify user and log error)
 
+    async def _send_error(self, connection_id: str, error: str):
+        """
+        基于预构建模板发送错误消息 (Send an error message built from the prebuilt template)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            error: 错误描述 (Error description)
+        """
+        error_message = self._error_template.model_copy(update={
+            "id": str(uuid.uuid4()),
+            "content": {"error": error},
+            "timestamp": _now(),
+            "metadata": {}
+        })
+        await self.connection_manager.send_to_connection(connection_id, error_message)
+
     # 内置命令处理方法 (Built-in command handling methods)
     
-    async def _handle_join_room_command(self, connection_id: str, args: Dict[str, Any]):
+    async def _handle_join_room_command(self, connection_id: str, message: WebSocketMessage, args: Mapping[str, Any]):
         """处理加入房间命令 (Handle join room command)"""
         room_id = args.get("room_id")
         if not room_id:
-            error_message = WebSocketMessage(
-                type=MessageType.ERROR,
-                content={"error": "缺少房间ID参数 (Missing room_id parameter)"},
-                sender_id="system",
-                receiver_id=None,
-                room_id=None,
-                timestamp=datetime.utcnow()
-            )
-            await self.connection_manager.send_to_connection(connection_id, error_message)
+            await self._send_error(connection_id, "缺少房间ID参数 (Missing room_id parameter)")
             return
 
         success = await self.connection_manager.join_room(connection_id, room_id)
         
-        response_message = WebSocketMessage(
+        response_message = WebSocketMessage.model_construct(
             type=MessageType.COMMAND,
             content={
                 "command": "join_room_response",
@@ -357,29 +364,21 @@ class WebSocketMessageHandler:
             sender_id="system",
             receiver_id=None,
             room_id=None,
-            timestamp=datetime.utcnow()
+            timestamp=_now()
         )
         
         await self.connection_manager.send_to_connection(connection_id, response_message)
 
-    async def _handle_leave_room_command(self, connection_id: str, args: Dict[str, Any]):
+    async def _handle_leave_room_command(self, connection_id: str, message: WebSocketMessage, args: Mapping[str, Any]):
         """处理离开房间命令 (Handle leave room command)"""
         room_id = args.get("room_id")
         if not room_id:
-            error_message = WebSocketMessage(
-                type=MessageType.ERROR,
-                content={"error": "缺少房间ID参数 (Missing room_id parameter)"},
-                sender_id="system",
-                receiver_id=None,
-                room_id=None,
-                timestamp=datetime.utcnow()
-            )
-            await self.connection_manager.send_to_connection(connection_id, error_message)
+            await self._send_error(connection_id, "缺少房间ID参数 (Missing room_id parameter)")
             return
 
         success = await self.connection_manager.leave_room(connection_id, room_id)
         
-        response_message = WebSocketMessage(
+        response_message = WebSocketMessage.model_construct(
             type=MessageType.COMMAND,
             content={
                 "command": "leave_room_response",
@@ -390,26 +389,18 @@ class WebSocketMessageHandler:
             sender_id="system",
             receiver_id=None,
             room_id=None,
-            timestamp=datetime.utcnow()
+            timestamp=_now()
         )
         
         await self.connection_manager.send_to_connection(connection_id, response_message)
 
-    async def _handle_create_room_command(self, connection_id: str, args: Dict[str, Any]):
+    async def _handle_create_room_command(self, connection_id: str, message: WebSocketMessage, args: Mapping[str, Any]):
         """处理创建房间命令 (Handle create room command)"""
         room_id = args.get("room_id")
         room_name = args.get("room_name", room_id)
         
         if not room_id:
-            error_message = WebSocketMessage(
-                type=MessageType.ERROR,
-                content={"error": "缺少房间ID参数 (Missing room_id parameter)"},
-                sender_id="system",
-                receiver_id=None,
-                room_id=None,
-                timestamp=datetime.utcnow()
-            )
-            await self.connection_manager.send_to_connection(connection_id, error_message)
+            await self._send_error(connection_id, "缺少房间ID参数 (Missing room_id parameter)")
             return
 
         # 获取创建者信息 (Get creator info)
@@ -427,7 +418,7 @@ class WebSocketMessageHandler:
 
         success = await self.connection_manager.create_room(room_info)
         
-        response_message = WebSocketMessage(
+        response_message = WebSocketMessage.model_construct(
             type=MessageType.COMMAND,
             content={
                 "command": "create_room_response",
@@ -438,27 +429,28 @@ class WebSocketMessageHandler:
             sender_id="system",
             receiver_id=None,
             room_id=None,
-            timestamp=datetime.utcnow()
+            timestamp=_now()
         )
         
         await self.connection_manager.send_to_connection(connection_id, response_message)
 
-    async def _handle_list_rooms_command(self, connection_id: str, args: Dict[str, Any]):
+    async def _handle_list_rooms_command(self, connection_id: str, message: WebSocketMessage, args: Mapping[str, Any]):
         """处理列出房间命令 (Handle list rooms command)"""
-        rooms_info = []
-        for room_id, room_info in self.connection_manager.rooms.items():
-            member_count = len(await self.connection_manager.get_room_members(room_id))
-            rooms_info.append({
+        member_counts = await self.connection_manager.get_all_room_member_counts()
+        rooms_info = [
+            {
                 "room_id": room_id,
                 "name": room_info.name,
                 "description": room_info.description,
-                "member_count": member_count,
+                "member_count": member_counts.get(room_id, 0),
                 "max_members": room_info.max_members,
                 "is_private": room_info.is_private,
                 "created_at": room_info.created_at.isoformat()
-            })
+            }
+            for room_id, room_info in self.connection_manager.rooms.items()
+        ]
 
-        response_message = WebSocketMessage(
+        response_message = WebSocketMessage.model_construct(
             type=MessageType.COMMAND,
             content={
                 "command": "list_rooms_response",
@@ -468,12 +460,12 @@ class WebSocketMessageHandler:
             sender_id="system",
             receiver_id=None,
             room_id=None,
-            timestamp=datetime.utcnow()
+            timestamp=_now()
         )
         
         await self.connection_manager.send_to_connection(connection_id, response_message)
 
-    async def _handle_get_connection_info_command(self, connection_id: str, args: Dict[str, Any]):
+    async def _handle_get_connection_info_command(self, connection_id: str, message: WebSocketMessage, args: Mapping[str, Any]):
         """处理获取连接信息命令 (Handle get connection info command)"""
         conn_info = await self.connection_manager.get_connection_info(connection_id)
         
@@ -488,7 +480,7 @@ class WebSocketMessageHandler:
         else:
             info_data = None
 
-        response_message = WebSocketMessage(
+        response_message = WebSocketMessage.model_construct(
             type=MessageType.COMMAND,
             content={
                 "command": "get_connection_info_response",
@@ -497,21 +489,32 @@ class WebSocketMessageHandler:
             sender_id="system",
             receiver_id=None,
             room_id=None,
-            timestamp=datetime.utcnow()
+            timestamp=_now()
         )
         
         await self.connection_manager.send_to_connection(connection_id, response_message)
 
-    def register_command_handler(self, command: str, handler: callable):
+    def register_command_handler(self, command: str, handler: CommandHandler):
         """
         注册自定义命令处理器 (Register custom command handler)
         
         Args:
             command: 命令名称 (Command name)
-            handler: 处理器函数 (Handler function)
+            handler: 处理器函数，签名为 (connection_id, message, args) (Handler function taking (connection_id, message, args))
         """
         self.command_handlers[command] = handler
-        logger.info(f"已注册自定义命令处理器 (Custom command handler registered): {command}")
+        self._rebuild_command_table()
+        logger.info("已注册自定义命令处理器 (Custom command handler registered): %s", command)
+
+    def _rebuild_command_table(self):
+        """
+        重建合并后的命令分发表 (Rebuild the merged command dispatch table)
+        
+        内置命令覆盖同名自定义命令，键名被驻留 (Built-ins win over custom commands of the same name; keys are interned)
+        """
+        table = {sys.intern(name): handler for name, handler in self.command_handlers.items()}
+        table.update((sys.intern(name), handler) for name, handler in self._builtin_commands.items())
+        self._command_table = MappingProxyType(table)
 
     def unregister_command_handler(self, command: str):
         """
@@ -522,7 +525,8 @@ class WebSocketMessageHandler:
         """
         if command in self.command_handlers:
             del self.command_handlers[command]
-            logger.info(f"已取消注册自定义命令处理器 (Custom command handler unregistered): {command}")
+            self._rebuild_command_table()
+            logger.info("已取消注册自定义命令处理器 (Custom command handler unregistered): %s", command)
 
 
 # 创建默认消息处理器实例的工厂函数 (Factory function to create default message handler instance)
@@ -4,13 +4,19 @@ WebSocket 连接管理器 (WebSocket Connection Manager)
 """
 
 import asyncio
-import json
+import heapq
 import logging
+import sys
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set, Any
-from fastapi import WebSocket
-import weakref
+from datetime import datetime
+from enum import Enum
+from typing import AbstractSet, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Any, Union
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.websockets import WebSocketState
+from websockets.exceptions import ConnectionClosed
+from pydantic import BaseModel
+import orjson
 
 from .models import (
     ConnectionInfo, 
@@ -18,15 +24,85 @@ from .models import (
     UserInfo, 
     WebSocketMessage, 
     MessageType, 
-    RoomInfo, 
-    BroadcastMessage,
-    WebSocketError
+    RoomInfo
 )
 
 # 配置日志 (Configure logging)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 时间戳缓存粒度（秒）(Timestamp cache granularity in seconds)
+_TIMESTAMP_CACHE_TTL = 0.01
+
+
+class _TimestampCache:
+    """
+    按粒度缓存的当前 UTC 时间及其 ISO 字符串 (Current UTC time and its ISO string, cached per granularity)
+    
+    心跳和消息处理中避免重复构造 datetime 并格式化，管理器和处理器共用
+    (Avoids building and formatting a datetime per message/heartbeat; shared by the manager and handler)
+    """
+    __slots__ = ("value", "iso", "expires")
+
+    def __init__(self):
+        self.value: Optional[datetime] = None
+        self.iso: str = ""
+        self.expires: float = 0.0
+
+    def refresh(self):
+        now = time.monotonic()
+        if now >= self.expires:
+            self.value = datetime.utcnow()
+            self.iso = self.value.isoformat()
+            self.expires = now + _TIMESTAMP_CACHE_TTL
+
+
+_timestamp_cache = _TimestampCache()
+
+
+def _now() -> datetime:
+    """获取缓存的当前 UTC 时间 (Get the cached current UTC time)"""
+    _timestamp_cache.refresh()
+    return _timestamp_cache.value
+
+
+def _now_iso() -> str:
+    """获取缓存的当前 UTC 时间 ISO 字符串 (Get the cached current UTC time as ISO string)"""
+    _timestamp_cache.refresh()
+    return _timestamp_cache.iso
+
+
+# 每个连接写队列的最大积压帧数，超出视为慢消费者 (Max frames queued per connection; beyond this the client is a slow consumer)
+WRITE_QUEUE_SIZE = 256
+
+# 共享的空排除集合 (Shared empty exclusion set for the common "exclude nothing" case)
+_EMPTY_FS: FrozenSet[str] = frozenset()
+
+
+def _as_exclude_set(exclude_connections: Optional[Iterable[str]]) -> AbstractSet[str]:
+    """
+    将排除参数规范化为集合，已是集合时直接复用 (Normalize excludes to a set, reusing it when it already is one)
+    
+    兼容旧调用方传入的列表 (Still accepts lists from older callers)
+    """
+    if not exclude_connections:
+        return _EMPTY_FS
+    if isinstance(exclude_connections, (frozenset, set)):
+        return exclude_connections
+    return frozenset(exclude_connections)
+
+
+def _json_default(obj: Any) -> Any:
+    """
+    orjson 无法原生序列化的对象的回退处理 (Fallback for objects orjson cannot serialize natively)
+    
+    嵌套的 pydantic 模型转换为字典，其他对象转换为字符串
+    (Nested pydantic models become dicts, anything else becomes a string)
+    """
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return str(obj)
+
 
 class WebSocketConnectionManager:
     """
@@ -54,6 +130,9 @@ class WebSocketConnectionManager:
         # 房间连接映射: room_id -> Set[connection_id] (Room to connections mapping)
         self.room_connections: Dict[str, Set[str]] = {}
         
+        # 房间成员快照: room_id -> Tuple[connection_id]，成员变化时失效 (Room member snapshots, invalidated on membership change)
+        self._room_member_snapshot: Dict[str, Tuple[str, ...]] = {}
+        
         # 房间信息字典: room_id -> RoomInfo (Room information)
         self.rooms: Dict[str, RoomInfo] = {}
         
@@ -66,8 +145,25 @@ class WebSocketConnectionManager:
         # 连接超时时间（秒）(Connection timeout in seconds)
         self.connection_timeout: int = 90
         
+        # 每个连接的写队列和写任务: connection_id -> (Queue, Task) (Per-connection write queue and writer task)
+        self._writers: Dict[str, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        
+        # 后台清理任务的强引用，防止被垃圾回收 (Strong refs to background cleanup tasks so they are not GC'd)
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # 心跳截止时间: connection_id -> 单调时钟截止时间，收到 PONG 时刷新
+        # (Heartbeat deadlines on the loop's monotonic clock, refreshed on every PONG)
+        self._pong_deadlines: Dict[str, float] = {}
+        
+        # 按截止时间排序的最小堆，过期条目惰性丢弃 (Min-heap of (deadline, connection_id); stale entries are dropped lazily)
+        self._expiry_heap: List[Tuple[float, str]] = []
+        
+        # 预编码的 PING 帧模板 (Pre-encoded PING frame template)
+        self._ping_template = self.build_frame_template(MessageType.PING, {}, None)
+        
         # 消息处理器字典: message_type -> handler (Message handlers)
-        self.message_handlers: Dict[MessageType, Any] = {}
+        # 以消息类型的字符串值为键 (Keyed by the string value of the message type)
+        self.message_handlers: Dict[str, Any] = {}
         
         logger.info("WebSocket 连接管理器已初始化 (WebSocket Connection Manager initialized)")
 
@@ -107,6 +203,11 @@ class WebSocketConnectionManager:
         self.active_connections[conn_info.connection_id] = websocket
         self.connection_info[conn_info.connection_id] = conn_info
         
+        # 启动该连接的写任务，所有发送经由写队列 (Start the connection's writer; every send goes through its queue)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        writer = asyncio.create_task(self._writer_loop(conn_info.connection_id, websocket, queue))
+        self._writers[conn_info.connection_id] = (queue, writer)
+        
         # 如果有用户信息，建立用户连接映射 (Map user to connection if user info provided)
         if user_info and user_info.user_id:
             if user_info.user_id not in self.user_connections:
@@ -127,21 +228,53 @@ class WebSocketConnectionManager:
         """
         断开 WebSocket 连接 (Disconnect WebSocket connection)
         
+        立即同步清理连接状态，关闭握手在后台完成，断开风暴不会串行阻塞
+        (Connection state is evicted synchronously right away and the close handshake runs in the
+        background, so disconnect storms do not serialize on slow closes)
+        
         Args:
             connection_id: 连接ID (Connection ID)
             code: 断开连接代码 (Disconnection code)
         """
-        if connection_id not in self.active_connections:
-            logger.warning(f"尝试断开不存在的连接 (Trying to disconnect non-existent connection): {connection_id}")
-            return
+        websocket = self._evict_state(connection_id)
+        if websocket:
+            self._spawn_background(self._async_close(connection_id, websocket, code))
+
+    async def disconnect_and_wait(self, connection_id: str, code: int = 1000):
+        """
+        断开 WebSocket 连接并等待关闭完成 (Disconnect and wait for the close handshake to finish)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            code: 断开连接代码 (Disconnection code)
+        """
+        websocket = self._evict_state(connection_id)
+        if websocket:
+            await self._async_close(connection_id, websocket, code)
+
+    def _evict_state(self, connection_id: str) -> Optional[WebSocket]:
+        """
+        同步移除连接的所有状态 (Synchronously remove all state of a connection)
         
-        # 获取连接信息 (Get connection information)
-        conn_info = self.connection_info.get(connection_id)
+        Args:
+            connection_id: 连接ID (Connection ID)
+            
+        Returns:
+            Optional[WebSocket]: 被移除的 WebSocket，连接不存在时为 None (Evicted WebSocket, None if unknown)
+        """
+        websocket = self.active_connections.pop(connection_id, None)
+        if websocket is None:
+            logger.warning(f"尝试断开不存在的连接 (Trying to disconnect non-existent connection): {connection_id}")
+            return None
         
-        # 从房间中移除连接 (Remove connection from rooms)
+        conn_info = self.connection_info.pop(connection_id, None)
         if conn_info:
-            for room_id in conn_info.rooms.copy():
-                await self.leave_room(connection_id, room_id)
+            # 从房间中移除连接 (Remove connection from rooms)
+            for room_id in conn_info.rooms:
+                room_members = self.room_connections.get(room_id)
+                if room_members is not None:
+                    room_members.discard(connection_id)
+                    self._room_member_snapshot.pop(room_id, None)
             
             # 从用户连接映射中移除 (Remove from user connections mapping)
             if conn_info.user_info and conn_info.user_info.user_id:
@@ -151,23 +284,114 @@ class WebSocketConnectionManager:
                     if not self.user_connections[user_id]:
                         del self.user_connections[user_id]
         
-        # 移除连接 (Remove connection)
-        websocket = self.active_connections.pop(connection_id, None)
-        self.connection_info.pop(connection_id, None)
+        self._pong_deadlines.pop(connection_id, None)
         
-        # 关闭 WebSocket 连接 (Close WebSocket connection)
-        if websocket:
-            try:
-                await websocket.close(code=code)
-            except Exception as e:
-                logger.error(f"关闭连接时发生错误 (Error closing connection): {e}")
+        # 停止写任务，未发送的帧随连接一起丢弃 (Stop the writer; unsent frames are dropped with the connection)
+        writer_entry = self._writers.pop(connection_id, None)
+        if writer_entry and writer_entry[1] is not asyncio.current_task():
+            writer_entry[1].cancel()
         
         logger.info(f"连接已断开 (Connection disconnected): {connection_id}")
         
         # 如果没有活跃连接，停止心跳检测 (Stop heartbeat if no active connections)
         if not self.active_connections and self.heartbeat_task:
-            self.heartbeat_task.cancel()
+            if self.heartbeat_task is not asyncio.current_task():
+                self.heartbeat_task.cancel()
             self.heartbeat_task = None
+        
+        return websocket
+
+    async def _async_close(self, connection_id: str, websocket: WebSocket, code: int):
+        """
+        关闭 WebSocket 连接 (Close the WebSocket connection)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            websocket: WebSocket 连接对象 (WebSocket connection object)
+            code: 断开连接代码 (Disconnection code)
+        """
+        try:
+            await websocket.close(code=code)
+        except Exception as e:
+            logger.error(f"关闭连接时发生错误 (Error closing connection) {connection_id}: {e}")
+
+    def _spawn_background(self, coro):
+        """
+        启动受跟踪的后台任务 (Start a tracked background task)
+        
+        Args:
+            coro: 要运行的协程 (Coroutine to run)
+        """
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def encode_message(message: WebSocketMessage) -> str:
+        """
+        将消息序列化为 JSON 文本帧 (Serialize a message into a JSON text frame)
+        
+        广播时只需序列化一次，再将同一帧发送给所有连接
+        (Broadcasts serialize once and send the same frame to every connection)
+        
+        Args:
+            message: 要序列化的消息 (Message to serialize)
+            
+        Returns:
+            str: JSON 文本 (JSON text)
+        """
+        # 直接从字段构建字典，由 orjson 在 C 中完成序列化（datetime/Enum 原生支持）
+        # (Build the dict from fields directly; orjson serializes datetime/Enum natively in C)
+        message_data = {
+            "id": message.id,
+            "type": message.type,
+            "content": message.content,
+            "sender_id": message.sender_id,
+            "receiver_id": message.receiver_id,
+            "room_id": message.room_id,
+            "timestamp": message.timestamp,
+            "metadata": message.metadata,
+        }
+        return orjson.dumps(message_data, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @classmethod
+    def build_frame_template(
+        cls,
+        message_type: MessageType,
+        base_content: Mapping[str, Any],
+        sender_id: Optional[str]
+    ) -> str:
+        """
+        预编码系统消息，返回以 (id, 内容时间戳, 消息时间戳) 为参数的 %-格式模板
+        (Pre-encode a system message into a %-template taking (id, content timestamp, timestamp))
+        
+        通过 encode_message 生成，保证与其他消息格式一致
+        (Built with encode_message so the frame layout matches every other message)
+        
+        Args:
+            message_type: 消息类型 (Message type)
+            base_content: 内容中的固定字段，时间戳字段会被追加 (Fixed content fields; a timestamp field is appended)
+            sender_id: 发送者ID (Sender ID)
+            
+        Returns:
+            str: %-格式帧模板 (%-format frame template)
+        """
+        placeholder = "\x01{}\x01"
+        template_message = WebSocketMessage.model_construct(
+            id=placeholder.format("id"),
+            type=message_type,
+            content={**base_content, "timestamp": placeholder.format("content_timestamp")},
+            sender_id=sender_id,
+            receiver_id=None,
+            room_id=None,
+            timestamp=placeholder.format("timestamp"),
+            metadata={}
+        )
+        frame = cls.encode_message(template_message).replace("%", "%%")
+        for name in ("id", "content_timestamp", "timestamp"):
+            # 控制字符在 JSON 中被转义为 \u0001 (Control chars are escaped as \u0001 in JSON)
+            frame = frame.replace(f"\\u0001{name}\\u0001", "%s")
+        return frame
 
     async def send_to_connection(self, connection_id: str, message: WebSocketMessage) -> bool:
         """
@@ -178,27 +402,102 @@ class WebSocketConnectionManager:
             message: 要发送的消息 (Message to send)
             
         Returns:
-            bool: 发送是否成功 (Whether sending was successful)
+            bool: 是否已放入写队列，不代表已送达 (Whether the frame was queued; not a delivery confirmation)
+        """
+        if connection_id not in self.active_connections:
+            logger.warning(f"连接不存在 (Connection does not exist): {connection_id}")
+            return False
+        
+        return self.enqueue_frame(connection_id, self.encode_message(message))
+
+    async def send_raw_to_connection(self, connection_id: str, frame: str) -> bool:
+        """
+        向指定连接发送已序列化的消息帧 (Send a pre-serialized frame to a specific connection)
+        
+        帧被放入连接的写队列，由写任务按顺序发送，调用方不等待网络写入
+        (The frame is queued for the connection's writer task, which sends in order; callers do not wait on the network)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            frame: encode_message 生成的 JSON 文本 (JSON text from encode_message)
+            
+        Returns:
+            bool: 是否已放入写队列，不代表已送达 (Whether the frame was queued; not a delivery confirmation)
+        """
+        return self.enqueue_frame(connection_id, frame)
+
+    def enqueue_frame(self, connection_id: str, frame: str) -> bool:
+        """
+        将帧放入连接的写队列 (Put a frame on a connection's write queue)
+        
+        同步执行，不创建任务；写队列已满时在后台断开该慢连接
+        (Runs synchronously without creating tasks; a full queue disconnects the slow client in the background)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            frame: encode_message 生成的 JSON 文本 (JSON text from encode_message)
+            
+        Returns:
+            bool: 是否已放入写队列，不代表已送达 (Whether the frame was queued; not a delivery confirmation)
         """
-        websocket = self.active_connections.get(connection_id)
-        if not websocket:
+        writer_entry = self._writers.get(connection_id)
+        if not writer_entry:
             logger.warning(f"连接不存在 (Connection does not exist): {connection_id}")
             return False
         
         try:
-            # 将消息转换为JSON格式 (Convert message to JSON format)
-            message_data = message.model_dump()
-            # 确保datetime字段被正确序列化 (Ensure datetime fields are properly serialized)
-            if 'timestamp' in message_data and hasattr(message_data['timestamp'], 'isoformat'):
-                message_data['timestamp'] = message_data['timestamp'].isoformat()
-            await websocket.send_text(json.dumps(message_data, ensure_ascii=False, default=str))
+            writer_entry[0].put_nowait(frame)
             return True
-        except Exception as e:
-            logger.error(f"发送消息失败 (Failed to send message) {connection_id}: {e}")
-            # 连接可能已断开，清理连接 (Connection might be broken, clean up)
-            await self.disconnect(connection_id)
+        except asyncio.QueueFull:
+            logger.error(f"写队列已满，断开慢连接 (Write queue full, dropping slow connection): {connection_id}")
+            # 客户端跟不上发送速度，清理连接 (Client cannot keep up, clean up)
+            self._schedule_disconnect(connection_id)
             return False
 
+    async def _writer_loop(self, connection_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        连接的写任务，按入队顺序发送帧 (Per-connection writer task, sends frames in queue order)
+        
+        慢连接只会阻塞自己的写任务，不会阻塞广播方
+        (A slow client only blocks its own writer, never the broadcaster)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+            websocket: WebSocket 连接对象 (WebSocket connection object)
+            queue: 该连接的写队列 (The connection's write queue)
+        """
+        while True:
+            frame = await queue.get()
+            
+            # 先检查状态，已关闭的连接不再尝试发送 (Check state first; never attempt a send on a closed socket)
+            if (websocket.client_state is not WebSocketState.CONNECTED
+                    or websocket.application_state is not WebSocketState.CONNECTED):
+                logger.info(f"连接已关闭，停止发送 (Connection closed, stopping writer): {connection_id}")
+                break
+            
+            try:
+                await websocket.send_text(frame)
+            except (WebSocketDisconnect, ConnectionClosed, OSError) as e:
+                logger.error(f"发送消息失败 (Failed to send message) {connection_id}: {e}")
+                break
+            except Exception as e:
+                # 非连接类错误只丢弃当前帧，不断开连接 (Non-connection errors drop this frame only, the connection stays up)
+                logger.error(f"发送消息失败 (Failed to send message) {connection_id}: {e}")
+        
+        # 连接已断开，清理连接 (Connection is gone, clean up)
+        self._schedule_disconnect(connection_id)
+
+    def _schedule_disconnect(self, connection_id: str):
+        """
+        立即移除连接状态并在后台关闭连接 (Evict connection state now and close it in the background)
+        
+        Args:
+            connection_id: 连接ID (Connection ID)
+        """
+        websocket = self._evict_state(connection_id)
+        if websocket:
+            self._spawn_background(self._async_close(connection_id, websocket, 1000))
+
     async def send_to_user(self, user_id: str, message: WebSocketMessage) -> int:
         """
         向指定用户的所有连接发送消息 (Send message to all connections of a specific user)
@@ -208,60 +507,109 @@ class WebSocketConnectionManager:
             message: 要发送的消息 (Message to send)
             
         Returns:
-            int: 成功发送的连接数量 (Number of successful sends)
+            int: 已放入写队列的连接数量，不代表已送达 (Number of connections the frame was queued for; not a delivery count)
         """
-        connection_ids = self.user_connections.get(user_id, set())
-        success_count = 0
-        
-        for connection_id in connection_ids.copy():
-            if await self.send_to_connection(connection_id, message):
-                success_count += 1
+        connection_ids = self.user_connections.get(user_id)
+        if not connection_ids:
+            return 0
         
-        return success_count
+        return await self._fanout_raw(list(connection_ids), self.encode_message(message))
 
-    async def broadcast_to_all(self, message: WebSocketMessage, exclude_connections: Optional[List[str]] = None) -> int:
+    async def broadcast_to_all(self, message: WebSocketMessage, exclude_connections: AbstractSet[str] = _EMPTY_FS) -> int:
         """
         向所有连接广播消息 (Broadcast message to all connections)
         
         Args:
             message: 要广播的消息 (Message to broadcast)
-            exclude_connections: 要排除的连接ID列表 (Connection IDs to exclude)
+            exclude_connections: 要排除的连接ID集合 (Set of connection IDs to exclude)
             
         Returns:
-            int: 成功发送的连接数量 (Number of successful sends)
+            int: 已放入写队列的连接数量，不代表已送达 (Number of connections the frame was queued for; not a delivery count)
         """
-        exclude_set = set(exclude_connections or [])
-        success_count = 0
+        return await self.broadcast_raw_to_all(self.encode_message(message), exclude_connections)
+
+    async def broadcast_raw_to_all(self, frame: str, exclude_connections: AbstractSet[str] = _EMPTY_FS) -> int:
+        """
+        向所有连接广播已序列化的消息帧 (Broadcast a pre-serialized frame to all connections)
         
-        for connection_id in list(self.active_connections.keys()):
-            if connection_id not in exclude_set:
-                if await self.send_to_connection(connection_id, message):
-                    success_count += 1
+        所有连接共享同一个帧对象，只放入各连接的写队列，慢连接不会阻塞其他连接
+        (All connections share one frame, which is only queued per connection, so slow clients do not block others)
         
-        return success_count
+        Args:
+            frame: encode_message 生成的 JSON 文本 (JSON text from encode_message)
+            exclude_connections: 要排除的连接ID集合 (Set of connection IDs to exclude)
+            
+        Returns:
+            int: 已放入写队列的连接数量，不代表已送达 (Number of connections the frame was queued for; not a delivery count)
+        """
+        exclude_set = _as_exclude_set(exclude_connections)
+        if not exclude_set:
+            return await self._fanout_raw(list(self.active_connections), frame)
+        return await self._fanout_raw(
+            [connection_id for connection_id in self.active_connections if connection_id not in exclude_set],
+            frame
+        )
 
-    async def broadcast_to_room(self, room_id: str, message: WebSocketMessage, exclude_connections: Optional[List[str]] = None) -> int:
+    async def broadcast_to_room(self, room_id: str, message: WebSocketMessage, exclude_connections: AbstractSet[str] = _EMPTY_FS) -> int:
         """
         向房间内的所有连接广播消息 (Broadcast message to all connections in a room)
         
         Args:
             room_id: 房间ID (Room ID)
             message: 要广播的消息 (Message to broadcast)
-            exclude_connections: 要排除的连接ID列表 (Connection IDs to exclude)
+            exclude_connections: 要排除的连接ID集合 (Set of connection IDs to exclude)
+            
+        Returns:
+            int: 已放入写队列的连接数量，不代表已送达 (Number of connections the frame was queued for; not a delivery count)
+        """
+        members = self._room_members(room_id)
+        if not members:
+            return 0
+        
+        exclude_set = _as_exclude_set(exclude_connections)
+        if exclude_set:
+            members = [connection_id for connection_id in members if connection_id not in exclude_set]
+        return await self._fanout_raw(members, self.encode_message(message))
+
+    def _room_members(self, room_id: str) -> Tuple[str, ...]:
+        """
+        获取房间成员的不可变快照，成员不变时复用 (Get an immutable snapshot of room members, reused until membership changes)
+        
+        Args:
+            room_id: 房间ID (Room ID)
             
         Returns:
-            int: 成功发送的连接数量 (Number of successful sends)
+            Tuple[str, ...]: 房间内的连接ID (Connection IDs in the room)
+        """
+        members = self._room_member_snapshot.get(room_id)
+        if members is None:
+            members = tuple(self.room_connections.get(room_id, ()))
+            self._room_member_snapshot[room_id] = members
+        return members
+
+    async def _fanout_raw(self, connection_ids: Sequence[str], frame: str) -> int:
         """
-        connection_ids = self.room_connections.get(room_id, set())
-        exclude_set = set(exclude_connections or [])
-        success_count = 0
+        向多个连接发送同一帧 (Send one frame to many connections)
         
-        for connection_id in connection_ids.copy():
-            if connection_id not in exclude_set:
-                if await self.send_to_connection(connection_id, message):
-                    success_count += 1
+        入队是同步的 put_nowait，直接循环即可，不为每个连接创建任务；失败连接的清理在后台进行。
+        传入的必须是快照，入队失败会同步移除连接状态
+        (Queueing is a synchronous put_nowait, so a plain loop is enough and no per-connection tasks are
+        created; failed connections are cleaned up in the background. Pass a snapshot, since a failed
+        enqueue evicts connection state synchronously)
         
-        return success_count
+        Args:
+            connection_ids: 目标连接ID快照 (Snapshot of target connection IDs)
+            frame: encode_message 生成的 JSON 文本 (JSON text from encode_message)
+            
+        Returns:
+            int: 已放入写队列的连接数量，不代表已送达 (Number of connections the frame was queued for; not a delivery count)
+        """
+        queued = 0
+        enqueue_frame = self.enqueue_frame
+        for connection_id in connection_ids:
+            if enqueue_frame(connection_id, frame):
+                queued += 1
+        return queued
 
     async def create_room(self, room_info: RoomInfo) -> bool:
         """
@@ -279,6 +627,7 @@ class WebSocketConnectionManager:
         
         self.rooms[room_info.room_id] = room_info
         self.room_connections[room_info.room_id] = set()
+        self._room_member_snapshot.pop(room_info.room_id, None)
         
         logger.info(f"新房间已创建 (New room created): {room_info.room_id}")
         return True
@@ -310,6 +659,7 @@ class WebSocketConnectionManager:
         
         # 添加到房间 (Add to room)
         self.room_connections[room_id].add(connection_id)
+        self._room_member_snapshot.pop(room_id, None)
         
         # 更新连接信息 (Update connection info)
         conn_info = self.connection_info[connection_id]
@@ -332,6 +682,7 @@ class WebSocketConnectionManager:
         """
         if room_id in self.room_connections:
             self.room_connections[room_id].discard(connection_id)
+            self._room_member_snapshot.pop(room_id, None)
         
         # 更新连接信息 (Update connection info)
         if connection_id in self.connection_info:
@@ -354,6 +705,16 @@ class WebSocketConnectionManager:
         """
         return list(self.room_connections.get(room_id, set()))
 
+    async def get_all_room_member_counts(self) -> Dict[str, int]:
+        """
+        一次性获取所有房间的成员数量 (Get member counts of all rooms in one pass)
+        
+        Returns:
+            Dict[str, int]: 房间ID到成员数量的映射 (Room ID to member count mapping)
+        """
+        room_connections = self.room_connections
+        return {room_id: len(room_connections.get(room_id, ())) for room_id in self.rooms}
+
     async def get_connection_info(self, connection_id: str) -> Optional[ConnectionInfo]:
         """
         获取连接信息 (Get connection information)
@@ -416,28 +777,22 @@ class WebSocketConnectionManager:
         检查连接状态 (Check connection status)
         发送心跳并清理超时连接
         """
-        current_time = datetime.utcnow()
-        timeout_connections = []
+        timeout_connections = self._pop_expired_connections(asyncio.get_running_loop().time())
+        expired = set(timeout_connections)
         
-        for connection_id, conn_info in self.connection_info.items():
-            # 检查连接是否超时 (Check if connection timed out)
-            if conn_info.last_ping:
-                time_since_ping = current_time - conn_info.last_ping
-                if time_since_ping.total_seconds() > self.connection_timeout:
-                    timeout_connections.append(connection_id)
-                    continue
-            
-            # 发送心跳 (Send ping)
-            ping_message = WebSocketMessage(
-                type=MessageType.PING,
-                content={"timestamp": current_time.isoformat()},
-                sender_id=None,
-                receiver_id=None,
-                room_id=None,
-                timestamp=current_time
-            )
+        # 本轮所有连接共享同一个 PING 帧，由模板填入 id 和时间戳 (One PING frame per tick, filled in from the template)
+        timestamp = _now_iso()
+        ping_frame = self._ping_template % (uuid.uuid4(), timestamp, timestamp)
+        
+        for connection_id in list(self.connection_info):
+            # 超时连接已由截止时间堆找出 (Timed-out connections were already found via the deadline heap)
+            if connection_id in expired:
+                continue
             
-            if not await self.send_to_connection(connection_id, ping_message):
+            # 发送心跳；写队列已满时 enqueue_frame 已安排断开，只有仍存在的连接才需要在下面清理
+            # (Send ping; on a full queue enqueue_frame has already scheduled the disconnect,
+            # so only connections that still exist are cleaned up below)
+            if not self.enqueue_frame(connection_id, ping_frame) and connection_id in self.connection_info:
                 timeout_connections.append(connection_id)
         
         # 清理超时连接 (Clean up timeout connections)
@@ -453,17 +808,49 @@ class WebSocketConnectionManager:
             connection_id: 连接ID (Connection ID)
         """
         if connection_id in self.connection_info:
-            self.connection_info[connection_id].last_ping = datetime.utcnow()
+            self.connection_info[connection_id].last_ping = _now()
+            deadline = asyncio.get_running_loop().time() + self.connection_timeout
+            self._pong_deadlines[connection_id] = deadline
+            heapq.heappush(self._expiry_heap, (deadline, connection_id))
 
-    def register_message_handler(self, message_type: MessageType, handler):
+    def _pop_expired_connections(self, now: float) -> List[str]:
+        """
+        弹出截止时间已过的连接，只访问已过期的堆条目 (Pop connections whose deadline has passed, touching only expired heap entries)
+        
+        从未回复 PONG 的连接没有截止时间，与原先只对有心跳记录的连接判定超时一致
+        (Connections that never sent a PONG have no deadline, matching the previous rule that only
+        connections with a recorded heartbeat can time out)
+        
+        Args:
+            now: 事件循环单调时钟的当前时间 (Current time on the event loop's monotonic clock)
+            
+        Returns:
+            List[str]: 已超时的连接ID列表 (IDs of timed-out connections)
+        """
+        expired = []
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            deadline, connection_id = heapq.heappop(heap)
+            # 之后又收到过 PONG 或已断开的条目已过期，直接丢弃 (Entries superseded by a later PONG or a disconnect are stale)
+            if self._pong_deadlines.get(connection_id) == deadline:
+                del self._pong_deadlines[connection_id]
+                expired.append(connection_id)
+        return expired
+
+    def register_message_handler(self, message_type: Union[MessageType, str], handler):
         """
         注册消息处理器 (Register message handler)
         
+        键统一为驻留的字符串值；MessageType 是 str 枚举，按枚举成员查找同样命中
+        (Keys are normalized to interned string values; MessageType is a str enum, so lookups by member still hit)
+        
         Args:
-            message_type: 消息类型 (Message type)
+            message_type: 消息类型或其字符串值 (Message type or its string value)
             handler: 处理器函数 (Handler function)
         """
-        self.message_handlers[message_type] = handler
+        if isinstance(message_type, Enum):
+            message_type = message_type.value
+        self.message_handlers[sys.intern(message_type)] = handler
         logger.info(f"已注册消息处理器 (Message handler registered): {message_type}")
 
     async def handle_message(self, connection_id: str, message: WebSocketMessage):
@@ -486,7 +873,7 @@ class WebSocketConnectionManager:
                     sender_id=None,
                     receiver_id=None,
                     room_id=None,
-                    timestamp=datetime.utcnow()
+                    timestamp=_now()
                 )
                 await self.send_to_connection(connection_id, error_message)
         else:
@@ -3,14 +3,19 @@ WebSocket 工具函数 (WebSocket Utility Functions)
 提供 WebSocket 相关的实用工具函数，包括消息验证、连接状态检查、数据转换等
 """
 
-import json
+import functools
 import logging
+import os
 import re
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Union, Tuple
 from urllib.parse import parse_qs, urlparse
-import hashlib
-import secrets
+
+import orjson
+import xxhash
+from pydantic import TypeAdapter
 
 from .models import (
     WebSocketMessage, 
@@ -20,10 +25,45 @@ from .models import (
     ConnectionStatus,
     WebSocketError
 )
+from . import WebSocketConfig
 
 # 配置日志 (Configure logging)
 logger = logging.getLogger(__name__)
 
+# 预编译的正则表达式 (Precompiled regular expressions)
+_USER_ID_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_CLEAN_NAME_RE = re.compile(r'[^\w]')
+
+# 单个消息帧的最大 UTF-8 字节数，超出时不做解析直接拒绝 (Maximum UTF-8 size of a frame; larger frames are rejected without parsing)
+MAX_FRAME_BYTES = 64 * 1024
+
+# WebSocketMessage 的校验器，从已解析的字典构建模型 (Validator building WebSocketMessage from the parsed dict)
+_MESSAGE_ADAPTER = TypeAdapter(WebSocketMessage)
+
+# 有效的消息类型值 (Valid message type values)
+_MESSAGE_TYPE_VALUES = frozenset(e.value for e in MessageType)
+
+# 用户输入中需要删除的字符 (Characters removed from user input)
+_SANITIZE_TABLE = str.maketrans('', '', '<>"\'')
+
+# sanitize_user_input 的缓存条目数及可缓存的最大输入长度
+# (Cache size of sanitize_user_input and the longest input it caches)
+SANITIZE_CACHE_SIZE = 2048
+SANITIZE_CACHE_MAX_INPUT = 256
+
+# 按秒缓存的 ID 时间戳: [秒, "%Y%m%d%H%M%S"] (ID timestamp cached per second: [second, "%Y%m%d%H%M%S"])
+_id_timestamp_cache: List[Any] = [-1, ""]
+
+
+def _id_timestamp() -> str:
+    """获取当前秒的 UTC ID 时间戳 (Get the UTC ID timestamp for the current second)"""
+    now_s = time.time_ns() // 1_000_000_000
+    if _id_timestamp_cache[0] != now_s:
+        _id_timestamp_cache[0] = now_s
+        _id_timestamp_cache[1] = time.strftime("%Y%m%d%H%M%S", time.gmtime(now_s))
+    return _id_timestamp_cache[1]
+
 
 def generate_connection_id() -> str:
     """
@@ -32,9 +72,7 @@ def generate_connection_id() -> str:
     Returns:
         str: 连接ID (Connection ID)
     """
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    random_str = secrets.token_hex(8)
-    return f"conn_{timestamp}_{random_str}"
+    return f"conn_{_id_timestamp()}_{os.urandom(8).hex()}"
 
 
 def generate_room_id(room_name: str = "") -> str:
@@ -49,13 +87,10 @@ def generate_room_id(room_name: str = "") -> str:
     """
     if room_name:
         # 清理房间名称，只保留字母数字和下划线 (Clean room name, keep only alphanumeric and underscore)
-        clean_name = re.sub(r'[^\w]', '_', room_name.lower())
-        timestamp = datetime.utcnow().strftime("%Y%m%d")
-        return f"room_{clean_name}_{timestamp}"
+        clean_name = _CLEAN_NAME_RE.sub('_', room_name.lower())
+        return f"room_{clean_name}_{_id_timestamp()[:8]}"
     else:
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        random_str = secrets.token_hex(6)
-        return f"room_{timestamp}_{random_str}"
+        return f"room_{_id_timestamp()}_{os.urandom(6).hex()}"
 
 
 def validate_message(message_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
@@ -70,13 +105,13 @@ def validate_message(message_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]
     """
     try:
         # 检查必需字段 (Check required fields)
-        required_fields = ["type", "content"]
-        for field in required_fields:
-            if field not in message_data:
-                return False, f"缺少必需字段 (Missing required field): {field}"
+        if "type" not in message_data:
+            return False, "缺少必需字段 (Missing required field): type"
+        if "content" not in message_data:
+            return False, "缺少必需字段 (Missing required field): content"
         
         # 检查消息类型是否有效 (Check if message type is valid)
-        if message_data["type"] not in [e.value for e in MessageType]:
+        if message_data["type"] not in _MESSAGE_TYPE_VALUES:
             return False, f"无效的消息类型 (Invalid message type): {message_data['type']}"
         
         # 检查内容字段 (Check content field)
@@ -96,33 +131,75 @@ def validate_message(message_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]
         return False, f"消息验证错误 (Message validation error): {str(e)}"
 
 
-def parse_websocket_message(raw_message: str) -> Tuple[Optional[WebSocketMessage], Optional[str]]:
+def _exceeds_utf8_bytes(raw_message: Union[str, bytes], limit: int) -> bool:
     """
-    解析 WebSocket 原始消息 (Parse WebSocket raw message)
+    判断消息的 UTF-8 字节数是否超过上限，只在无法由字符数确定时才编码
+    (Check whether a message's UTF-8 size exceeds a limit, encoding only when the character count cannot decide)
+    """
+    length = len(raw_message)
+    if length > limit:
+        # 每个字符至少占 1 字节 (Every character takes at least one byte)
+        return True
+    if isinstance(raw_message, (bytes, bytearray)) or length * 4 <= limit:
+        # 每个字符至多占 4 字节 (Every character takes at most four bytes)
+        return False
+    return len(raw_message.encode("utf-8", "surrogatepass")) > limit
+
+
+def parse_websocket_frame(raw_message: str) -> Tuple[Optional[WebSocketMessage], Optional[str], Optional[str]]:
+    """
+    解析并校验 WebSocket 原始消息，JSON 只解析一次 (Parse and validate a raw WebSocket message, decoding the JSON once)
     
     Args:
         raw_message: 原始消息字符串 (Raw message string)
         
     Returns:
-        Tuple[Optional[WebSocketMessage], Optional[str]]: (解析后的消息, 错误信息) (Parsed message, Error message)
+        Tuple[Optional[WebSocketMessage], Optional[str], Optional[str]]:
+            (解析后的消息, 错误代码, 错误信息) (Parsed message, Error code, Error message)；
+            错误代码为 MESSAGE_TOO_LARGE、INVALID_JSON、COMMAND_TOO_LARGE、INVALID_MESSAGE 或 PARSE_ERROR
+            (error code is MESSAGE_TOO_LARGE, INVALID_JSON, COMMAND_TOO_LARGE, INVALID_MESSAGE or PARSE_ERROR)
     """
+    if _exceeds_utf8_bytes(raw_message, MAX_FRAME_BYTES):
+        return None, "MESSAGE_TOO_LARGE", f"消息过大 (Message too large): 超过 {MAX_FRAME_BYTES} 字节 (exceeds {MAX_FRAME_BYTES} bytes)"
+    
     try:
         # 解析JSON (Parse JSON)
-        message_data = json.loads(raw_message)
-        
-        # 验证消息格式 (Validate message format)
-        is_valid, error_msg = validate_message(message_data)
-        if not is_valid:
-            return None, error_msg
-        
-        # 创建WebSocketMessage对象 (Create WebSocketMessage object)
-        message = WebSocketMessage(**message_data)
-        return message, None
-        
-    except json.JSONDecodeError as e:
-        return None, f"JSON解析错误 (JSON parsing error): {str(e)}"
+        message_data = orjson.loads(raw_message)
+    except orjson.JSONDecodeError as e:
+        return None, "INVALID_JSON", f"JSON解析错误 (JSON parsing error): {str(e)}"
+    
+    # 在校验和构建模型之前拒绝超大命令帧 (Reject oversized command frames before validation and model construction)
+    if (
+        isinstance(message_data, dict)
+        and message_data.get("type") == MessageType.COMMAND.value
+        and _exceeds_utf8_bytes(raw_message, WebSocketConfig.MAX_COMMAND_BYTES)
+    ):
+        return None, "COMMAND_TOO_LARGE", f"命令消息过大 (Command too large): 超过 {WebSocketConfig.MAX_COMMAND_BYTES} 字节 (exceeds {WebSocketConfig.MAX_COMMAND_BYTES} bytes)"
+    
+    # 验证消息格式 (Validate message format)
+    is_valid, error_msg = validate_message(message_data)
+    if not is_valid:
+        return None, "INVALID_MESSAGE", error_msg
+    
+    try:
+        # 从已解析的字典创建WebSocketMessage对象 (Create WebSocketMessage object from the parsed dict)
+        return _MESSAGE_ADAPTER.validate_python(message_data), None, None
     except Exception as e:
-        return None, f"消息解析错误 (Message parsing error): {str(e)}"
+        return None, "PARSE_ERROR", f"消息解析错误 (Message parsing error): {str(e)}"
+
+
+def parse_websocket_message(raw_message: str) -> Tuple[Optional[WebSocketMessage], Optional[str]]:
+    """
+    解析 WebSocket 原始消息 (Parse WebSocket raw message)
+    
+    Args:
+        raw_message: 原始消息字符串 (Raw message string)
+        
+    Returns:
+        Tuple[Optional[WebSocketMessage], Optional[str]]: (解析后的消息, 错误信息) (Parsed message, Error message)
+    """
+    message, _, error_message = parse_websocket_frame(raw_message)
+    return message, error_message
 
 
 def serialize_message(message: WebSocketMessage) -> str:
@@ -137,10 +214,11 @@ def serialize_message(message: WebSocketMessage) -> str:
     """
     try:
         message_dict = message.model_dump()
-        return json.dumps(message_dict, ensure_ascii=False, default=str)
+        # orjson 原生输出 UTF-8，datetime 序列化为 ISO 8601 (orjson emits UTF-8 natively and datetimes as ISO 8601)
+        return orjson.dumps(message_dict, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
     except Exception as e:
         logger.error(f"消息序列化错误 (Message serialization error): {e}")
-        return json.dumps({"error": "序列化失败 (Serialization failed)"})
+        return orjson.dumps({"error": "序列化失败 (Serialization failed)"}).decode()
 
 
 def extract_query_params(url: str) -> Dict[str, str]:
@@ -185,14 +263,13 @@ def validate_user_info(user_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
         
         # 验证用户ID格式 (Validate user ID format)
         user_id = user_data["user_id"]
-        if not re.match(r'^[a-zA-Z0-9_-]+$', user_id):
+        if not _USER_ID_RE.match(user_id):
             return False, "用户ID格式无效，只允许字母、数字、下划线和连字符 (Invalid user ID format)"
         
         # 验证邮箱格式（如果提供）(Validate email format if provided)
         if "email" in user_data and user_data["email"]:
             email = user_data["email"]
-            email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            if not re.match(email_pattern, email):
+            if not _EMAIL_RE.match(email):
                 return False, "邮箱格式无效 (Invalid email format)"
         
         return True, None
@@ -230,6 +307,41 @@ def create_error_message(error_code: str, error_message: str, connection_id: Opt
     )
 
 
+def create_error_bytes(error_code: str, error_message: str, connection_id: Optional[str] = None) -> bytes:
+    """
+    直接生成错误消息的 JSON 字节 (Build an error message directly as JSON bytes)
+    
+    与 create_error_message 序列化后的格式相同，但跳过 WebSocketError 和 WebSocketMessage 的模型校验
+    (Same layout as a serialized create_error_message result, without the WebSocketError/WebSocketMessage validation passes)
+    
+    Args:
+        error_code: 错误代码 (Error code)
+        error_message: 错误消息 (Error message)
+        connection_id: 连接ID (Connection ID)
+        
+    Returns:
+        bytes: 错误消息 JSON 字节 (Error message JSON bytes)
+    """
+    now = datetime.utcnow()
+    return orjson.dumps({
+        "id": str(uuid.uuid4()),
+        "type": MessageType.ERROR,
+        "content": {
+            "error_code": error_code,
+            "error_message": error_message,
+            "error_type": "websocket_error",
+            "timestamp": now,
+            "connection_id": connection_id,
+            "additional_info": {}
+        },
+        "sender_id": "system",
+        "receiver_id": None,
+        "room_id": None,
+        "timestamp": now,
+        "metadata": {}
+    })
+
+
 def format_connection_info(conn_info: ConnectionInfo) -> Dict[str, Any]:
     """
     格式化连接信息用于传输 (Format connection info for transmission)
@@ -301,11 +413,14 @@ def generate_message_hash(message: WebSocketMessage) -> str:
     Returns:
         str: 消息哈希值 (Message hash)
     """
-    # 创建消息的唯一标识符 (Create unique identifier for message)
-    content_str = json.dumps(message.content, sort_keys=True, ensure_ascii=False)
-    hash_input = f"{message.type}_{content_str}_{message.sender_id}_{message.receiver_id}_{message.room_id}"
-    
-    return hashlib.md5(hash_input.encode('utf-8')).hexdigest()
+    # 去重无需加密强度，使用 xxh3；键排序保证相同内容得到相同哈希
+    # (Dedup needs no cryptographic strength, so use xxh3; sorted keys keep equal content hashing equally)
+    hash_input = orjson.dumps(
+        [message.type, message.content, message.sender_id, message.receiver_id, message.room_id],
+        default=str,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    )
+    return xxhash.xxh3_64_hexdigest(hash_input)
 
 
 def filter_connections_by_criteria(
@@ -322,34 +437,38 @@ def filter_connections_by_criteria(
     Returns:
         List[str]: 符合条件的连接ID列表 (List of matching connection IDs)
     """
+    # 条件在循环外预处理一次 (Criteria are prepared once outside the loop)
+    check_status = "status" in criteria
+    status = criteria.get("status")
+    check_room = "room_id" in criteria
+    room_id = criteria.get("room_id")
+    required_roles = frozenset(criteria["roles"]) if "roles" in criteria else None
+    cutoff = None
+    if "min_connection_time" in criteria:
+        cutoff = datetime.utcnow() - timedelta(seconds=criteria["min_connection_time"])
+    
     matching_connections = []
     
+    # 按开销从低到高检查，不匹配立即跳过 (Check cheapest first and skip on the first mismatch)
     for conn_id, conn_info in connections.items():
-        match = True
-        
         # 检查状态条件 (Check status criteria)
-        if "status" in criteria and conn_info.status != criteria["status"]:
-            match = False
-        
-        # 检查用户角色条件 (Check user role criteria)
-        if "roles" in criteria and conn_info.user_info:
-            required_roles = criteria["roles"]
-            if not any(role in conn_info.user_info.roles for role in required_roles):
-                match = False
+        if check_status and conn_info.status != status:
+            continue
         
         # 检查房间条件 (Check room criteria)
-        if "room_id" in criteria:
-            if criteria["room_id"] not in conn_info.rooms:
-                match = False
+        if check_room and room_id not in conn_info.rooms:
+            continue
+        
+        # 检查用户角色条件 (Check user role criteria)
+        if (required_roles is not None and conn_info.user_info
+                and required_roles.isdisjoint(conn_info.user_info.roles)):
+            continue
         
         # 检查连接时间条件 (Check connection time criteria)
-        if "min_connection_time" in criteria:
-            min_time = timedelta(seconds=criteria["min_connection_time"])
-            if calculate_connection_duration(conn_info) < min_time:
-                match = False
+        if cutoff is not None and conn_info.connected_at > cutoff:
+            continue
         
-        if match:
-            matching_connections.append(conn_id)
+        matching_connections.append(conn_id)
     
     return matching_connections
 
@@ -372,9 +491,10 @@ def create_system_notification(
     Returns:
         WebSocketMessage: 系统通知消息 (System notification message)
     """
+    now = datetime.utcnow()
     notification_content = {
         "type": notification_type,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": now.isoformat(),
         **content
     }
     
@@ -384,7 +504,7 @@ def create_system_notification(
         sender_id="system",
         receiver_id=target_user,
         room_id=target_room,
-        timestamp=datetime.utcnow()
+        timestamp=now
     )
 
 
@@ -402,8 +522,16 @@ def sanitize_user_input(user_input: str, max_length: int = 1000) -> str:
     if not isinstance(user_input, str):
         return ""
     
+    # 只缓存短输入，避免长文本占用缓存内存 (Only short inputs are cached so long text does not pin memory)
+    if len(user_input) <= SANITIZE_CACHE_MAX_INPUT:
+        return _sanitize_cached(user_input, max_length)
+    return _sanitize(user_input, max_length)
+
+
+def _sanitize(user_input: str, max_length: int) -> str:
+    """清理字符串输入 (Sanitize a string input)"""
     # 移除潜在危险字符 (Remove potentially dangerous characters)
-    sanitized = re.sub(r'[<>"\']', '', user_input)
+    sanitized = user_input.translate(_SANITIZE_TABLE)
     
     # 限制长度 (Limit length)
     sanitized = sanitized[:max_length]
@@ -414,6 +542,9 @@ def sanitize_user_input(user_input: str, max_length: int = 1000) -> str:
     return sanitized
 
 
+_sanitize_cached = functools.lru_cache(maxsize=SANITIZE_CACHE_SIZE)(_sanitize)
+
+
 def get_client_info_from_headers(headers: Dict[str, str]) -> Dict[str, Optional[str]]:
     """
     从请求头中提取客户端信息 (Extract client info from headers)
@@ -464,6 +595,27 @@ MESSAGE_TEMPLATES = {
 }
 
 
+def _build_template_plan(template: Dict[str, Any]) -> Tuple[Tuple[str, Any, bool], ...]:
+    """
+    预先标记模板中需要格式化的字段 (Mark which template fields need formatting, ahead of time)
+    
+    Returns:
+        Tuple: (键, 值, 是否需要格式化) 序列，保持模板字段顺序 ((key, value, needs_format) entries in template order)
+    """
+    return tuple(
+        (key, value, isinstance(value, str) and "{" in value)
+        for key, value in template.items()
+    )
+
+
+# 模板名 -> (模板对象, 格式化计划)；模板被替换时按需重建
+# (Template name -> (template object, format plan); rebuilt on demand when a template is replaced)
+_TEMPLATE_PLANS: Dict[str, Tuple[Dict[str, Any], Tuple[Tuple[str, Any, bool], ...]]] = {
+    name: (template, _build_template_plan(template))
+    for name, template in MESSAGE_TEMPLATES.items()
+}
+
+
 def create_message_from_template(template_name: str, **kwargs) -> Optional[WebSocketMessage]:
     """
     从模板创建消息 (Create message from template)
@@ -482,12 +634,15 @@ def create_message_from_template(template_name: str, **kwargs) -> Optional[WebSo
     
     try:
         # 格式化模板内容 (Format template content)
-        formatted_content = {}
-        for key, value in template.items():
-            if isinstance(value, str) and "{" in value:
-                formatted_content[key] = value.format(**kwargs)
-            else:
-                formatted_content[key] = value
+        cached = _TEMPLATE_PLANS.get(template_name)
+        if cached is None or cached[0] is not template:
+            cached = (template, _build_template_plan(template))
+            _TEMPLATE_PLANS[template_name] = cached
+        
+        formatted_content = {
+            key: value.format_map(kwargs) if needs_format else value
+            for key, value, needs_format in cached[1]
+        }
         
         return WebSocketMessage(
             type=MessageType.NOTIFICATION,
@@ -15,7 +15,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 
 # 导入所有API路由器
 from api import (
@@ -110,13 +110,24 @@ async def monitor_mcp_server_output():
         return
     
     try:
-        # 监控stdout
+        # 监控stdout，按块读取后在本地拆分行，减少每行一次的等待
+        pending = b""
         while True:
-            line = await mcp_server_process.stdout.readline()
-            if not line:
+            chunk = await mcp_server_process.stdout.read(8192)
+            if not chunk:
                 break
-            # 将MCP服务器的输出添加前缀后打印
-            print(f"[MCP] {line.decode().strip()}")
+            *lines, pending = (pending + chunk).split(b"\n")
+            # 与 readline 的默认上限一致，超长的未结束行直接输出
+            if len(pending) > 65536:
+                lines.append(pending)
+                pending = b""
+            if lines:
+                # 将MCP服务器的输出添加前缀后一次性写出
+                sys.stdout.write("".join(
+                    f"[MCP] {line.decode(errors='replace').strip()}\n" for line in lines
+                ))
+        if pending:
+            sys.stdout.write(f"[MCP] {pending.decode(errors='replace').strip()}\n")
             
     except Exception as e:
         logger.error(f"监控MCP服务器输出时发生错误: {e}")
@@ -153,19 +164,26 @@ async def initialize_all_services():
 
 async def periodic_cache_cleanup():
     """定期清理过期缓存的后台任务"""
+    loop = asyncio.get_running_loop()
+    # 按单调时钟上的固定截止时间调度，清理耗时不会让后续周期漂移
+    next_deadline = loop.time() + 1800  # 每30分钟清理一次过期缓存
     while True:
         try:
-            # 每30分钟清理一次过期缓存
-            await asyncio.sleep(1800)  # 30分钟
+            await asyncio.sleep(max(0.0, next_deadline - loop.time()))
             service_manager.clear_expired_cache()
             logger.info("定期清理过期缓存完成")
+            next_deadline += 1800
+            # 错过的周期直接跳过，不连续补跑
+            now = loop.time()
+            if next_deadline <= now:
+                next_deadline = now + 1800
         except asyncio.CancelledError:
             logger.info("缓存清理任务已停止")
             break
         except Exception as e:
             logger.error(f"定期清理过期缓存失败: {e}")
-            # 如果出错，等待10分钟后重试
-            await asyncio.sleep(600)
+            # 如果出错，10分钟后重试
+            next_deadline = loop.time() + 600
 
 # =========================
 # 应用生命周期管理
@@ -229,7 +247,9 @@ app = FastAPI(
     title="AI 个人日常助手服务",
     description="提供认证、会话管理、WebSocket通信等功能的智能助手服务",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # 默认使用 orjson 序列化 JSON 响应
+    default_response_class=ORJSONResponse
 )
 
 # =========================
@@ -239,8 +259,9 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # 明确列出前端使用的方法和请求头
+    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "Accept"],
 )
 
 # =========================
@@ -5,7 +5,7 @@
 """
 
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime, timedelta
 from threading import RLock
 from core.database_core import DatabaseClient
@@ -32,6 +32,9 @@ class ServiceManager:
         self._token_cache: Dict[str, Dict[str, Any]] = {}
         self._token_cache_expiry: Dict[str, datetime] = {}
         
+        # 缓存失效订阅者 - 数据写入后按依赖标签（如 "todos:{user_id}"）通知
+        self._invalidation_listeners: List[Callable[[str], None]] = []
+        
         # 连接池统计
         self._connection_pool_stats = {
             "total_connections": 0,
@@ -116,6 +119,30 @@ class ServiceManager:
         
         return self._services[service_name]
     
+    def subscribe_invalidation(self, listener: Callable[[str], None]):
+        """
+        订阅缓存失效通知
+        
+        Args:
+            listener: 回调函数，参数为失效的依赖标签
+        """
+        with self._lock:
+            if listener not in self._invalidation_listeners:
+                self._invalidation_listeners.append(listener)
+    
+    def publish_invalidation(self, tag: str):
+        """
+        发布缓存失效通知（在数据写入提交后调用）
+        
+        Args:
+            tag: 依赖标签，如 "todos:1"、"preferences:1"
+        """
+        for listener in list(self._invalidation_listeners):
+            try:
+                listener(tag)
+            except Exception as e:
+                self._logger.error(f"缓存失效回调执行失败 ({tag}): {e}")
+    
     def verify_token_cached(self, token: str) -> Optional[Dict[str, Any]]:
         """验证令牌（带缓存）"""
         # 检查缓存
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from core.database_core import DatabaseClient
 from ..models.user_preference import UserPreference
 from .user_service import UserService
+from ..service_manager import service_manager
 
 
 class PreferenceService:
@@ -105,6 +106,7 @@ class PreferenceService:
                     session.add(new_preference)
                     session.commit()
                 
+                service_manager.publish_invalidation(f"preferences:{user_id}")
                 return True
                 
         except Exception as e:
@@ -159,6 +161,7 @@ class PreferenceService:
                 if preference:
                     session.delete(preference)
                     session.commit()
+                    service_manager.publish_invalidation(f"preferences:{user_id}")
                     return True
                 return False
                 
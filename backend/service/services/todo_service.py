@@ -12,6 +12,7 @@ from core.database_core import DatabaseClient
 from ..models.todo import Todo
 from ..models.note import Note
 from .user_service import UserService
+from ..service_manager import service_manager
 
 
 class TodoService:
@@ -83,6 +84,7 @@ class TodoService:
                 session.commit()
                 session.refresh(todo)
                 
+                service_manager.publish_invalidation(f"todos:{user_id}")
                 return todo
                 
         except Exception as e:
@@ -197,6 +199,7 @@ class TodoService:
                 session.commit()
                 session.refresh(todo)
                 
+                service_manager.publish_invalidation(f"todos:{todo.user_id}")
                 return todo
                 
         except Exception as e:
@@ -218,8 +221,10 @@ class TodoService:
                 todo = session.query(Todo).filter(Todo.id == todo_id).first()
                 
                 if todo:
+                    user_id = todo.user_id
                     session.delete(todo)
                     session.commit()
+                    service_manager.publish_invalidation(f"todos:{user_id}")
                     return True
                 return False
                 
@@ -244,6 +249,7 @@ class TodoService:
                 if todo:
                     todo.mark_completed()
                     session.commit()
+                    service_manager.publish_invalidation(f"todos:{todo.user_id}")
                     return True
                 return False
                 
@@ -268,6 +274,7 @@ class TodoService:
                 if todo:
                     todo.mark_pending()
                     session.commit()
+                    service_manager.publish_invalidation(f"todos:{todo.user_id}")
                     return True
                 return False
                 